@@ -0,0 +1,147 @@
+import struct
+import threading
+import time
+from collections import deque
+
+# Binary frame message: header + JPEG bytes. Header = frame seq (uint32) + capture time (float64, epoch s)
+FRAME_HEADER = struct.Struct("!Id")
+
+# Quality ladder from best to cheapest: (max output width or None for native, JPEG quality)
+QUALITY_LEVELS = [
+    (None, 80),
+    (None, 65),
+    (1280, 60),
+    (960, 55),
+    (640, 50),
+    (480, 45),
+    (320, 40),
+]
+
+
+class AdaptiveStreamClient:
+    """Flow control and quality adaptation for one WebSocket video client.
+
+    The client acknowledges each binary frame with {"ack": seq}. At most
+    `max_in_flight` frames may be unacknowledged; newer frames are skipped until
+    the client catches up, so a slow link never builds a backlog. Every
+    `adapt_interval` seconds the acknowledged bitrate is compared to
+    `target_kbps` and the client moves along QUALITY_LEVELS: down when it overshot
+    the target or lagged because the link is queueing (frames skipped while the
+    round trip is well above its minimum), up when it has headroom. Lag from plain
+    latency alone doesn't lower quality, since smaller frames wouldn't help.
+    """
+
+    def __init__(self, cam_id, target_kbps=1500, max_in_flight=2, adapt_interval=2.0, level=0):
+        self.cam_id = cam_id
+        self.target_kbps = target_kbps
+        self.max_in_flight = max_in_flight
+        self.adapt_interval = adapt_interval
+        self.level = min(max(level, 0), len(QUALITY_LEVELS) - 1)
+        self.connected_at = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._in_flight = deque()       # (seq, nbytes, sent_at)
+        self._acked = deque()           # (acked_at, nbytes) within the last adapt_interval
+        self._skipped_since_adapt = 0
+        self._last_adapt = self.connected_at
+
+        # Counters
+        self.frames_sent = 0
+        self.frames_acked = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_acked = 0
+        self.rtt_ms = None
+        self.min_rtt_ms = None
+
+    def encode_params(self):
+        """(quality, max_width) for the next frame"""
+        max_width, quality = QUALITY_LEVELS[self.level]
+        return quality, max_width
+
+    def can_send(self):
+        with self._lock:
+            return len(self._in_flight) < self.max_in_flight
+
+    def on_skipped(self):
+        with self._lock:
+            self.frames_skipped += 1
+            self._skipped_since_adapt += 1
+
+    def on_sent(self, nbytes, now=None):
+        """Registers a frame about to be sent; returns its seq"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self._seq += 1
+            self._in_flight.append((self._seq, nbytes, now))
+            self.frames_sent += 1
+            self.bytes_sent += nbytes
+            return self._seq
+
+    def on_ack(self, seq, now=None):
+        """Acknowledges every frame up to and including seq"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            while self._in_flight and self._in_flight[0][0] <= seq:
+                acked_seq, nbytes, sent_at = self._in_flight.popleft()
+                self.frames_acked += 1
+                self.bytes_acked += nbytes
+                self._acked.append((now, nbytes))
+                if acked_seq == seq:
+                    self.rtt_ms = round((now - sent_at) * 1000, 1)
+                    if self.min_rtt_ms is None or self.rtt_ms < self.min_rtt_ms:
+                        self.min_rtt_ms = self.rtt_ms
+
+    def _window(self, now):
+        # Caller holds self._lock
+        while self._acked and now - self._acked[0][0] > self.adapt_interval:
+            self._acked.popleft()
+        frames = len(self._acked)
+        kbps = sum(nbytes for _, nbytes in self._acked) * 8 / 1000 / self.adapt_interval
+        return frames / self.adapt_interval, kbps
+
+    def adapt(self, now=None):
+        """Moves along the quality ladder; returns True if the level changed"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if now - self._last_adapt < self.adapt_interval:
+                return False
+            _, kbps = self._window(now)
+            queueing = self.rtt_ms is not None and self.rtt_ms > 1.5 * self.min_rtt_ms + 20
+            lagging = self._skipped_since_adapt > 0 and queueing
+            self._skipped_since_adapt = 0
+            self._last_adapt = now
+
+            level = self.level
+            if (lagging or kbps > self.target_kbps * 1.15) and level < len(QUALITY_LEVELS) - 1:
+                level += 1
+            elif not queueing and kbps < self.target_kbps * 0.6 and level > 0:
+                level -= 1
+            changed = level != self.level
+            self.level = level
+            return changed
+
+    def stats(self, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            fps, kbps = self._window(now)
+            quality, max_width = QUALITY_LEVELS[self.level][1], QUALITY_LEVELS[self.level][0]
+            return {
+                "cam_id": self.cam_id,
+                "connected_seconds": round(now - self.connected_at, 1),
+                "delivered_fps": round(fps, 1),
+                "delivered_kbps": round(kbps, 1),
+                "target_kbps": self.target_kbps,
+                "quality": quality,
+                "max_width": max_width,
+                "level": self.level,
+                "frames_sent": self.frames_sent,
+                "frames_acked": self.frames_acked,
+                "frames_skipped": self.frames_skipped,
+                "bytes_sent": self.bytes_sent,
+                "bytes_acked": self.bytes_acked,
+                "in_flight": len(self._in_flight),
+                "rtt_ms": self.rtt_ms,
+                "min_rtt_ms": self.min_rtt_ms,
+            }
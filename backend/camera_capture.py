@@ -0,0 +1,92 @@
+import threading
+import time
+import cv2
+
+from metrics import stage_metrics
+
+
+class CameraCapture:
+    """Reads a cv2.VideoCapture on a background thread and keeps only the newest frame.
+
+    The inference loop never blocks on the camera: it always picks up the most
+    recent decoded frame, and frames that were overwritten before anyone read
+    them are counted as dropped instead of piling up in the OpenCV/RTSP buffer.
+    """
+
+    def __init__(self, cap, source, reconnect_delay=1.0, name=None):
+        self.cap = cap
+        self.source = source
+        self.name = name if name is not None else str(source)   # metrics scope (camera id)
+        self.reconnect_delay = reconnect_delay
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0              # increments on every decoded frame
+        self._consumed = True      # has the current frame been read by anyone?
+        self._running = True
+
+        # Counters
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        self.reconnects = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"capture-{source}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            started = time.perf_counter()
+            success, frame = self.cap.read()
+            if not success:
+                # Maybe it's an IP cam that disconnected? Back off and reopen, off the inference path.
+                self.read_failures += 1
+                time.sleep(self.reconnect_delay)
+                if self._running and isinstance(self.source, str):
+                    self.cap.release()
+                    self.cap = cv2.VideoCapture(self.source)
+                    self.reconnects += 1
+                continue
+
+            stage_metrics.observe("capture", self.name, time.perf_counter() - started)
+            with self._cond:
+                if not self._consumed:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._seq += 1
+                self._consumed = False
+                self.frames_read += 1
+                self._cond.notify_all()
+
+        self.cap.release()
+
+    def read_latest(self, last_seq=0, timeout=1.0):
+        """Returns (seq, frame) for the newest frame after last_seq.
+
+        Waits up to `timeout` seconds for a new frame; on timeout returns
+        (last_seq, None) so the caller can re-check its own state and retry.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq or not self._running, timeout=timeout):
+                return last_seq, None
+            if self._frame is None or not self._running:
+                return last_seq, None
+            self._consumed = True
+            return self._seq, self._frame
+
+    def is_running(self):
+        return self._running
+
+    def release(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        # The capture thread releases the device once its current read returns
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "read_failures": self.read_failures,
+            "reconnects": self.reconnects,
+        }
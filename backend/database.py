@@ -1,6 +1,8 @@
 import os
+import sqlite3
 import subprocess
 import sys
+import threading
 
 # Attempt to import SQLAlchemy, install if missing
 try:
@@ -9,21 +11,172 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "sqlalchemy"])
     from sqlalchemy import create_engine
 
+from sqlalchemy import event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # SQLite database file in backend folder
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'logs.db')}"
+DB_PATH = os.path.join(BASE_DIR, 'logs.db')
+DATABASE_URL = f"sqlite:///{DB_PATH}"
+
+# --- DATABASE PROFILES ---
+# "tuned": WAL so analytics reads don't block detection writes, relaxed fsync
+# (safe with WAL; at worst the last transactions are lost on power failure),
+# bigger page cache, memory-mapped reads and a busy timeout instead of "database is locked".
+# "default": SQLite's stock settings (rollback journal, synchronous=FULL).
+DB_PROFILES = {
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,          # KiB (negative) -> 64 MB
+        "mmap_size": 268435456,        # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,          # ms
+        "auto_vacuum": "INCREMENTAL",
+        "reader_pool_size": 8,
+        "checkpoint_interval": 300,    # s between wal_checkpoint / incremental_vacuum runs
+        "vacuum_pages": 1000,          # free pages returned per incremental_vacuum
+    },
+    "default": {
+        "busy_timeout": 5000,
+        "reader_pool_size": 4,
+        "checkpoint_interval": 0,
+    },
+}
+DB_PROFILE = os.environ.get("DB_PROFILE", "tuned")
+profile = DB_PROFILES[DB_PROFILE]
+
+_CONNECTION_PRAGMAS = ("synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+def _apply_pragmas(dbapi_connection, read_only):
+    cursor = dbapi_connection.cursor()
+    for name in _CONNECTION_PRAGMAS:
+        if name in profile:
+            cursor.execute(f"PRAGMA {name}={profile[name]}")
+    if read_only:
+        # Guard against accidental writes through the reader pool
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _make_engine(pool_size, read_only):
+    eng = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": profile["busy_timeout"] / 1000},
+        pool_size=pool_size,
+        max_overflow=0 if not read_only else pool_size,
+        pool_pre_ping=False,
+    )
+    event.listen(eng, "connect", lambda conn, _: _apply_pragmas(conn, read_only))
+    return eng
+
+
+# Single writer connection (SQLite allows one writer at a time anyway) and a pool of readers
+engine = _make_engine(pool_size=1, read_only=False)
+read_engine = _make_engine(pool_size=profile["reader_pool_size"], read_only=True)
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+
+def init_database(vacuum=False):
+    """Persistent (per-file) settings: WAL journal and incremental auto-vacuum.
+
+    A new file gets the profile's auto_vacuum mode right away. On an existing file
+    the mode only changes with a full VACUUM, which rewrites the whole database and
+    blocks every writer meanwhile, so that only happens with vacuum=True
+    (`python database.py vacuum`); otherwise a warning is printed.
+    """
+    with engine.connect() as conn:
+        if "auto_vacuum" in profile:
+            current = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+            wanted = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}[profile["auto_vacuum"]]
+            if current != wanted:
+                is_empty = conn.execute(text("SELECT count(*) FROM sqlite_master")).scalar() == 0
+                if is_empty or vacuum:
+                    conn.execute(text(f"PRAGMA auto_vacuum={profile['auto_vacuum']}"))
+                    if not is_empty:
+                        print(f"[INFO] Rewriting {DB_PATH} for auto_vacuum={profile['auto_vacuum']}...")
+                        conn.exec_driver_sql("VACUUM")
+                else:
+                    print(f"[WARNING] {DB_PATH} doesn't use auto_vacuum={profile['auto_vacuum']} yet; "
+                          f"run 'python database.py vacuum' while the server is stopped to convert it")
+        if "journal_mode" in profile:
+            conn.execute(text(f"PRAGMA journal_mode={profile['journal_mode']}"))
+        conn.commit()
+
+
+class DatabaseMaintenance:
+    """Periodically checkpoints the WAL and returns free pages so logs.db doesn't keep growing"""
+
+    def __init__(self, interval=None, vacuum_pages=None):
+        self.interval = interval if interval is not None else profile.get("checkpoint_interval", 0)
+        self.vacuum_pages = vacuum_pages if vacuum_pages is not None else profile.get("vacuum_pages", 0)
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_checkpoint = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        # Own short-lived connection: the writer engine's single connection belongs to the
+        # log writer, and a checkpoint shouldn't make inserts queue up behind it
+        raw = sqlite3.connect(DB_PATH, timeout=profile["busy_timeout"] / 1000)
+        try:
+            cursor = raw.cursor()
+            if profile.get("journal_mode") == "WAL":
+                # (busy, wal pages, checkpointed pages)
+                self.last_checkpoint = tuple(cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+            if profile.get("auto_vacuum") == "INCREMENTAL" and self.vacuum_pages:
+                # sqlite frees one page per step, so the result has to be consumed
+                cursor.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+            cursor.close()
+            raw.commit()
+        finally:
+            raw.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[DB MAINTENANCE ERROR] {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session on the reader pool, for analytics / search endpoints"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="logs.db maintenance")
+    parser.add_argument("command", choices=["vacuum"],
+                        help="vacuum: apply the profile's auto_vacuum mode to an existing file (full VACUUM)")
+    args = parser.parse_args()
+    init_database(vacuum=True)
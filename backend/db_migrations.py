@@ -0,0 +1,119 @@
+"""In-place upgrades for existing logs.db files (run at startup after create_all)"""
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from gear_codes import GEAR_BITS
+from models import Log, DailyRollup, ProcessedVideo
+from rollups import rebuild_rollups
+
+
+def _mask_sql(column):
+    # Sum of the bits of every known gear name in a JSON array column
+    cases = " ".join(f"WHEN '{name}' THEN {bit}" for name, bit in GEAR_BITS.items())
+    return (f"(SELECT COALESCE(SUM(DISTINCT CASE lower(value) {cases} ELSE 0 END), 0) "
+            f"FROM json_each(COALESCE({column}, '[]')))")
+
+
+def migrate_log_bitmasks(engine):
+    """JSON detected/missing columns -> detected_mask/missing_mask/is_violation.
+
+    SQLite can't change column types in place, so the table is rebuilt: the old one
+    is renamed, the new schema created, rows copied with masks computed from the
+    JSON arrays, and the old table dropped. All in one transaction.
+    """
+    columns = {col["name"] for col in inspect(engine).get_columns("logs")}
+    if "detected_mask" in columns or "detected" not in columns:
+        return False
+
+    print("[INFO] Migrating detection logs to bitmask columns...")
+    with engine.begin() as conn:
+        for index in inspect(conn).get_indexes("logs"):
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+        conn.execute(text("ALTER TABLE logs RENAME TO logs_legacy"))
+        Log.__table__.create(conn)
+        conn.execute(text(f"""
+            INSERT INTO logs (id, person_id, timestamp, detected_mask, missing_mask, is_violation, source, confidence)
+            SELECT id, person_id, timestamp, {_mask_sql('detected')}, {_mask_sql('missing')},
+                   COALESCE(json_array_length(missing), 0) > 0, source, confidence
+            FROM logs_legacy
+        """))
+        migrated = conn.execute(text("SELECT COUNT(*) FROM logs")).scalar()
+        conn.execute(text("DROP TABLE logs_legacy"))
+    print(f"[INFO] Migrated {migrated} detection logs")
+    return True
+
+
+def add_episode_columns(engine):
+    """Rows are now episodes: adds end_timestamp / frame_count (old rows are single frames)"""
+    columns = {col["name"] for col in inspect(engine).get_columns("logs")}
+    added = False
+    with engine.begin() as conn:
+        if "end_timestamp" not in columns:
+            conn.execute(text("ALTER TABLE logs ADD COLUMN end_timestamp DATETIME"))
+            added = True
+        if "frame_count" not in columns:
+            conn.execute(text("ALTER TABLE logs ADD COLUMN frame_count INTEGER NOT NULL DEFAULT 1"))
+            added = True
+    return added
+
+
+def backfill_rollups(engine):
+    """Builds the rollup tables for databases created before they existed"""
+    with engine.connect() as conn:
+        has_logs = conn.execute(text("SELECT 1 FROM logs LIMIT 1")).first() is not None
+        has_rollups = conn.execute(text(f"SELECT 1 FROM {DailyRollup.__tablename__} LIMIT 1")).first() is not None
+    if has_logs and not has_rollups:
+        rebuild_rollups(engine)
+        return True
+    return False
+
+
+def backfill_video_catalog(engine, output_dir):
+    """Catalogs processed videos that were written before processed_videos existed"""
+    if not os.path.isdir(output_dir):
+        return 0
+    with engine.connect() as conn:
+        known = {row[0] for row in conn.execute(text(f"SELECT filename FROM {ProcessedVideo.__tablename__}"))}
+    files = [f for f in os.listdir(output_dir)
+             if f.startswith("processed_") and f.endswith((".webm", ".mp4")) and f not in known]
+    if not files:
+        return 0
+
+    import cv2
+    with engine.begin() as conn:
+        # Detection counts for all of them in one grouped query
+        counts = {
+            source: (total, violations)
+            for source, total, violations in conn.execute(text(
+                "SELECT source, COUNT(*), SUM(is_violation) FROM logs WHERE source LIKE 'processed_%' GROUP BY source"
+            ))
+        }
+        for filename in files:
+            path = os.path.join(output_dir, filename)
+            cap = cv2.VideoCapture(path)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+            thumb_name = f"thumb_{filename}.jpg"
+            total, violations = counts.get(filename, (0, 0))
+            conn.execute(ProcessedVideo.__table__.insert().values(
+                filename=filename,
+                thumbnail_url=f"/static/{thumb_name}" if os.path.exists(os.path.join(output_dir, thumb_name)) else None,
+                created_at=datetime.fromtimestamp(os.path.getmtime(path)),
+                duration=round(frame_count / fps, 2) if fps > 0 and frame_count > 0 else None,
+                frame_count=max(frame_count, 0),
+                violations=violations or 0,
+                total_detections=total,
+            ))
+    print(f"[INFO] Added {len(files)} existing videos to the catalog")
+    return len(files)
+
+
+def run_migrations(engine, output_dir=None):
+    migrate_log_bitmasks(engine)
+    add_episode_columns(engine)
+    backfill_rollups(engine)
+    if output_dir:
+        backfill_video_catalog(engine, output_dir)
@@ -0,0 +1,102 @@
+import threading
+
+
+class EpisodeAggregator:
+    """Folds per-frame person entries into track-level episodes.
+
+    An episode is one tracked person in one state: same status and same missing
+    gear, from the first frame it was seen to the last. It is closed when the
+    person's status or missing gear changes, or when the track hasn't been seen for
+    `lost_after` seconds of the caller's clock (wall time for live cameras, video
+    time for uploads). Closed episodes have the shape of a detection entry plus
+    end_timestamp, start/end time, duration and frame_count, so they can be stored
+    and displayed like one.
+    """
+
+    def __init__(self, lost_after=2.0):
+        self.lost_after = lost_after
+        self._open = {}     # source -> {person_id: episode}
+        self._lock = threading.Lock()
+        self.entries_seen = 0
+        self.episodes_closed = 0
+
+    def _start(self, entry, missing, now):
+        return {
+            "id": entry.get("id"),
+            "status": entry.get("status"),
+            "missing": missing,
+            "detected": set(entry.get("detected", [])),
+            "timestamp": entry.get("timestamp"),
+            "end_timestamp": entry.get("timestamp"),
+            "start_time": now,
+            "end_time": now,
+            "frame_count": 1,
+            "confidence": entry.get("confidence"),
+        }
+
+    @staticmethod
+    def _extend(episode, entry, now):
+        episode["detected"].update(entry.get("detected", []))
+        episode["end_timestamp"] = entry.get("timestamp")
+        episode["end_time"] = now
+        episode["frame_count"] += 1
+        conf = entry.get("confidence")
+        if conf is not None and (episode["confidence"] is None or conf > episode["confidence"]):
+            episode["confidence"] = conf
+
+    @staticmethod
+    def _public(episode):
+        record = dict(episode)
+        record["detected"] = sorted(episode["detected"])
+        record["duration"] = round(episode["end_time"] - episode["start_time"], 3)
+        return record
+
+    def update(self, source, entries, now):
+        """Feeds one frame's entries from `source`, observed at `now` (seconds).
+
+        Returns (opened, closed): snapshots of episodes that started on this frame
+        and the episodes that ended, ready to be logged.
+        """
+        opened, closed = [], []
+        with self._lock:
+            tracks = self._open.setdefault(source, {})
+            seen = set()
+            for entry in entries:
+                person_id = entry.get("id")
+                missing = sorted(entry.get("missing", []))
+                seen.add(person_id)
+                self.entries_seen += 1
+
+                episode = tracks.get(person_id)
+                if episode is not None and (episode["status"] != entry.get("status") or episode["missing"] != missing):
+                    closed.append(self._public(tracks.pop(person_id)))
+                    episode = None
+                if episode is None:
+                    tracks[person_id] = self._start(entry, missing, now)
+                    opened.append(self._public(tracks[person_id]))
+                else:
+                    self._extend(episode, entry, now)
+
+            # Tracks that disappeared
+            for person_id in [pid for pid, ep in tracks.items()
+                              if pid not in seen and now - ep["end_time"] > self.lost_after]:
+                closed.append(self._public(tracks.pop(person_id)))
+            self.episodes_closed += len(closed)
+        return opened, closed
+
+    def flush(self, source=None):
+        """Closes every open episode (of one source, or all). Returns {source: [episodes]}"""
+        with self._lock:
+            sources = [source] if source is not None else list(self._open)
+            closed = {}
+            for src in sources:
+                tracks = self._open.pop(src, {})
+                if tracks:
+                    closed[src] = [self._public(ep) for ep in tracks.values()]
+                    self.episodes_closed += len(tracks)
+            return closed
+
+    def stats(self):
+        with self._lock:
+            open_count = sum(len(tracks) for tracks in self._open.values())
+        return {"open": open_count, "closed": self.episodes_closed, "entries_seen": self.entries_seen}
@@ -0,0 +1,65 @@
+"""PPE classes and their bitmask encoding for stored detection logs"""
+
+# Class ids of the PPE detection model (bests-350epoch.pt)
+EQUIPMENT_CLASSES = {
+    0: 'Coverall',
+    1: 'Face_Shield',
+    2: 'Gloves',
+    3: 'Goggles',
+    4: 'Mask'
+}
+
+# Gear name (as used in detected/missing lists) -> bit; bit i is class id i
+GEAR_BITS = {name.lower(): 1 << cls_id for cls_id, name in EQUIPMENT_CLASSES.items()}
+ALL_GEAR_MASKS = range(1 << len(EQUIPMENT_CLASSES))
+
+
+_reported_unknown = set()
+
+
+def unknown_gear(names) -> list[str]:
+    """The names in `names` that have no bit (API input is checked with this)"""
+    return [name for name in names or () if str(name).lower() not in GEAR_BITS]
+
+
+def normalize_gear_names(names) -> list[str]:
+    """Validates required gear from the API: a list of known names -> lower-case names.
+
+    Raises ValueError for anything else (not a list of strings, or unknown names).
+    """
+    if not isinstance(names, (list, tuple, set)) or not all(isinstance(name, str) for name in names):
+        raise ValueError(f"required gear must be a list of names, got {names!r}")
+    names = [name.strip().lower() for name in names]
+    unknown = unknown_gear(names)
+    if unknown:
+        raise ValueError(f"unknown gear {unknown}, expected any of {sorted(GEAR_BITS)}")
+    return names
+
+
+def encode_gear(names) -> int:
+    """['mask', 'gloves'] -> 0b10100. Unknown names can't be stored; each is reported once."""
+    mask = 0
+    for name in names or ():
+        bit = GEAR_BITS.get(str(name).lower())
+        if bit is None:
+            if name not in _reported_unknown:
+                _reported_unknown.add(name)
+                print(f"[WARNING] Gear '{name}' is not a known PPE class and is left out of stored logs")
+            continue
+        mask |= bit
+    return mask
+
+
+def decode_gear(mask) -> list[str]:
+    """0b10100 -> ['gloves', 'mask'] (class id order)"""
+    if not mask:
+        return []
+    return [name for name, bit in GEAR_BITS.items() if mask & bit]
+
+
+def masks_with(name) -> list[int]:
+    """Every mask value containing `name`, so a gear filter can be an indexed IN (...) lookup"""
+    bit = GEAR_BITS.get(str(name).lower())
+    if bit is None:
+        return []
+    return [mask for mask in ALL_GEAR_MASKS if mask & bit]
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+from ultralytics import YOLO
+
+# Supported runtimes -> ultralytics export format (None = load the .pt weights directly)
+BACKENDS = {
+    'pytorch': None,
+    'onnx': 'onnx',          # ONNX Runtime
+    'openvino': 'openvino',  # Intel OpenVINO
+}
+
+
+def exported_path(weights_path, backend, int8=False):
+    """Where ultralytics puts (or we keep) the exported model for a given .pt file"""
+    stem, _ = os.path.splitext(weights_path)
+    if backend == 'onnx':
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return weights_path
+
+
+def export_model(model, weights_path, backend, int8=False, imgsz=640, calibration_data=None):
+    """Exports a loaded PyTorch YOLO model for a CPU runtime and returns the exported path.
+
+    Exports are dynamic-batch so the cross-camera scheduler can send several frames per call.
+    ONNX INT8 uses onnxruntime's dynamic quantization on top of the FP32 export; OpenVINO
+    INT8 uses ultralytics' post-training quantization (NNCF) with `calibration_data`.
+    """
+    target = exported_path(weights_path, backend, int8)
+    print(f"[INFO] Exporting {weights_path} -> {target} ({backend}{', int8' if int8 else ''})...")
+
+    if backend == 'onnx':
+        fp32_path = model.export(format='onnx', dynamic=True, imgsz=imgsz, simplify=True)
+        if int8:
+            try:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+            except ImportError:
+                raise RuntimeError("INT8 ONNX models need 'onnxruntime' (pip install onnxruntime)")
+            quantize_dynamic(fp32_path, target, weight_type=QuantType.QUInt8)
+            return target
+        return fp32_path
+
+    if backend == 'openvino':
+        kwargs = {'format': 'openvino', 'dynamic': True, 'imgsz': imgsz, 'int8': int8}
+        if int8 and calibration_data:
+            kwargs['data'] = calibration_data
+        exported = model.export(**kwargs)
+        return exported
+
+    raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def _box_iou(a, b):
+    """IoU matrix between two (N, 4) / (M, 4) xyxy arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+# Self-check outcomes
+MATCH, MISMATCH, INCONCLUSIVE = "match", "mismatch", "inconclusive"
+
+
+def match_detections(ref, cand, min_iou=0.85, max_conf_diff=0.1, max_count_diff=1, exact_below=5):
+    """Compares two sets of detections, each an (xyxy, cls, conf) tuple of arrays.
+
+    Every reference box must have a same-class candidate box with IoU >= min_iou and
+    a confidence within max_conf_diff. With fewer than `exact_below` reference boxes,
+    counts must be equal and every box must match; with more, counts and unmatched
+    boxes may be off by max_count_diff (INT8 models tend to gain/lose a marginal
+    detection). No reference boxes at all proves nothing and is INCONCLUSIVE.
+    Returns (MATCH | MISMATCH | INCONCLUSIVE, report dict).
+    """
+    ref_xyxy, ref_cls, ref_conf = ref
+    cand_xyxy, cand_cls, cand_conf = cand
+    report = {"reference_boxes": len(ref_xyxy), "candidate_boxes": len(cand_xyxy), "matched": 0, "mean_iou": None}
+    if len(ref_xyxy) == 0:
+        return (INCONCLUSIVE if len(cand_xyxy) == 0 else MISMATCH), report
+
+    slack = 0 if len(ref_xyxy) < exact_below else max_count_diff
+    if abs(len(ref_xyxy) - len(cand_xyxy)) > slack or len(cand_xyxy) == 0:
+        return MISMATCH, report
+
+    iou = _box_iou(ref_xyxy, cand_xyxy)
+    iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+    best = iou.argmax(axis=1)
+    best_iou = iou[np.arange(len(ref_xyxy)), best]
+    conf_ok = np.abs(ref_conf - cand_conf[best]) <= max_conf_diff
+    matched = (best_iou >= min_iou) & conf_ok
+
+    report["matched"] = int(matched.sum())
+    report["mean_iou"] = round(float(best_iou.mean()), 3)
+    return (MATCH if int((~matched).sum()) <= slack else MISMATCH), report
+
+
+def compare_detections(reference, candidate, sample, **tolerances):
+    """Runs both models on the sample frame and checks the candidate reproduces the reference (see match_detections)"""
+    def detections(model):
+        boxes = model(sample, verbose=False, device='cpu', conf=0.25)[0].boxes
+        return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), boxes.conf.cpu().numpy()
+
+    return match_detections(detections(reference), detections(candidate), **tolerances)
+
+
+def load_model(weights_path, backend='pytorch', int8=False, imgsz=640, self_check=True,
+               sample=None, calibration_data=None):
+    """Loads weights on the requested runtime, exporting them first if needed.
+
+    `weights_path` may point at the .pt file (exported on first use and reused after)
+    or directly at an existing .onnx / *_openvino_model export. With self_check, the
+    exported model is compared against the PyTorch weights on a sample frame (`sample`,
+    ideally a site image with people and gear in it; ultralytics' bus.jpg otherwise) and
+    the PyTorch model is used instead if they disagree.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    if backend == 'pytorch' or not weights_path.endswith('.pt'):
+        return YOLO(weights_path)
+
+    reference = YOLO(weights_path)
+    target = exported_path(weights_path, backend, int8)
+    if not os.path.exists(target):
+        try:
+            target = export_model(reference, weights_path, backend, int8, imgsz, calibration_data)
+        except Exception as e:
+            print(f"⚠️ WARNING: {backend} export of {weights_path} failed ({e}); using PyTorch")
+            return reference
+
+    candidate = YOLO(target, task=reference.task)
+    if not self_check:
+        return candidate
+
+    if sample is None:
+        from ultralytics.utils import ASSETS
+        sample = str(ASSETS / "bus.jpg")
+    status, report = compare_detections(reference, candidate, sample)
+    if status == MISMATCH:
+        print(f"⚠️ WARNING: {target} does not match {weights_path} on the self-check frame {report}; using PyTorch")
+        return reference
+    if status == INCONCLUSIVE:
+        print(f"⚠️ WARNING: self-check of {target} is inconclusive: {weights_path} detects nothing on {sample}. "
+              f"Using the export unverified; set INFERENCE_SELF_CHECK_IMAGE to a site image to check it.")
+        return candidate
+
+    print(f"✓ {backend} model verified against PyTorch: {report}")
+    return candidate
@@ -0,0 +1,105 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class InferenceRegion:
+    """Per-camera region of interest and inference resolution.
+
+    `rois` is a list of rectangles [x1, y1, x2, y2] and/or polygons
+    [[x, y], [x, y], ...], in pixels of the camera frame, or as fractions of the
+    frame size when every value is <= 1. Only the bounding box of all ROIs is
+    cropped out, pixels outside the polygons are blacked out, and the crop is
+    downscaled so its longer side is at most `inference_size`. Detections on that
+    image are mapped back to frame coordinates with map_boxes / map_points.
+    """
+
+    def __init__(self, rois=None, inference_size=None):
+        self.polygons = [self._polygon(roi) for roi in (rois or [])]
+        # Model input sizes must be multiples of the 32 px stride
+        self.inference_size = max(32, -(-int(inference_size) // 32) * 32) if inference_size else None
+        self._lock = threading.Lock()
+        self._layout = None     # (frame shape, (x1, y1, x2, y2), mask or None)
+
+    @staticmethod
+    def _polygon(roi):
+        points = np.asarray(roi, dtype=np.float32)
+        if points.ndim == 1:
+            if points.size != 4:
+                raise ValueError(f"ROI rectangle must be [x1, y1, x2, y2], got {roi}")
+            x1, y1, x2, y2 = points
+            points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise ValueError(f"ROI polygon needs at least 3 [x, y] points, got {roi}")
+        return points
+
+    def _layout_for(self, shape):
+        """Crop rectangle and polygon mask for a frame shape (computed once per shape)"""
+        with self._lock:
+            if self._layout is not None and self._layout[0] == shape:
+                return self._layout
+            h, w = shape[:2]
+            if not self.polygons:
+                self._layout = (shape, (0, 0, w, h), None)
+                return self._layout
+
+            polygons = []
+            for points in self.polygons:
+                if points.max() <= 1.0:
+                    points = points * np.array([w, h], dtype=np.float32)
+                polygons.append(np.round(points).astype(np.int32))
+            stacked = np.concatenate(polygons)
+            x1, y1 = np.clip(stacked.min(axis=0), 0, [w, h])
+            x2, y2 = np.clip(stacked.max(axis=0), 0, [w, h])
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                raise ValueError(f"ROIs {[p.tolist() for p in self.polygons]} fall outside the {w}x{h} frame")
+
+            mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            cv2.fillPoly(mask, [p - [x1, y1] for p in polygons], 255)
+            if cv2.countNonZero(mask) == mask.size:
+                mask = None   # the ROIs cover their whole bounding box (e.g. one rectangle)
+            self._layout = (shape, (int(x1), int(y1), int(x2), int(y2)), mask)
+            return self._layout
+
+    def validate(self, width, height):
+        """Raises ValueError if the ROIs don't fit a width x height frame"""
+        self._layout_for((height, width, 3))
+
+    def prepare(self, frame):
+        """-> (model input image, scale, (x, y) offset); frame = input / scale + offset"""
+        _, (x1, y1, x2, y2), mask = self._layout_for(frame.shape)
+        image = frame[y1:y2, x1:x2]
+        if mask is not None:
+            image = cv2.bitwise_and(image, image, mask=mask)
+
+        scale = 1.0
+        h, w = image.shape[:2]
+        if self.inference_size and max(h, w) > self.inference_size:
+            scale = self.inference_size / max(h, w)
+            image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+        return image, scale, (x1, y1)
+
+    @staticmethod
+    def map_boxes(boxes, scale, offset):
+        """(N, 4) xyxy boxes from the model input back to frame coordinates"""
+        boxes = np.asarray(boxes, dtype=np.float32)
+        if scale == 1.0 and offset == (0, 0):
+            return boxes
+        return boxes / scale + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+
+    @staticmethod
+    def map_points(points, scale, offset):
+        """(N, K, 2) keypoints back to frame coordinates; (0, 0) stays 'not visible'"""
+        points = np.asarray(points, dtype=np.float32)
+        if scale == 1.0 and offset == (0, 0):
+            return points
+        visible = (points != 0).any(axis=-1, keepdims=True)
+        return np.where(visible, points / scale + np.array(offset, dtype=np.float32), points)
+
+    def describe(self):
+        return {
+            "rois": [p.tolist() for p in self.polygons],
+            "inference_size": self.inference_size,
+            "crop": list(self._layout[1]) if self._layout is not None else None,
+        }
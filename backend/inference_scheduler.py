@@ -0,0 +1,160 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceScheduler:
+    """Collects the latest frame from every live camera and runs them through
+    the models as one batch.
+
+    A batch is dispatched as soon as `max_batch_size` streams are waiting or the
+    oldest waiting frame has been queued for `max_wait_ms`, whichever comes first,
+    so latency stays bounded even with a single camera.
+    """
+
+    def __init__(self, monitor, max_batch_size=16, max_wait_ms=15):
+        self.monitor = monitor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # stream_id -> [frame, [futures], enqueued_at]  (only the newest frame is kept)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # Counters
+        self.batches_run = 0
+        self.frames_run = 0
+        self.frames_replaced = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Inference scheduler started (batch={self.max_batch_size}, wait={self.max_wait * 1000:.0f}ms)")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+        # Unblock anyone still waiting on a result
+        with self._cond:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for _, futures, _ in pending:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, stream_id, frame):
+        """Queue a frame for the next batch. Returns a Future of (pose_data, equip_data).
+
+        If the stream already has a frame waiting, it is replaced by this newer one
+        and both callers receive the result of the newer frame.
+        """
+        fut = Future()
+        with self._cond:
+            if not self._running:
+                fut.set_exception(RuntimeError("Inference scheduler is not running"))
+                return fut
+            entry = self._pending.get(stream_id)
+            if entry is None:
+                self._pending[stream_id] = [frame, [fut], time.monotonic()]
+            else:
+                entry[0] = frame
+                entry[1].append(fut)
+                self.frames_replaced += 1
+            self._cond.notify_all()
+        return fut
+
+    def infer(self, stream_id, frame, timeout=None):
+        """Blocking helper for generator loops"""
+        return self.submit(stream_id, frame).result(timeout=timeout)
+
+    def discard(self, stream_id):
+        """Drop a stream's pending frame and its StreamContext (camera removed)"""
+        with self._cond:
+            entry = self._pending.pop(stream_id, None)
+        if entry:
+            for fut in entry[1]:
+                if not fut.done():
+                    fut.set_exception(RuntimeError(f"Stream {stream_id} removed"))
+        self.monitor.release_context(stream_id)
+
+    def stats(self):
+        return {
+            "batches": self.batches_run,
+            "frames": self.frames_run,
+            "avg_batch_size": round(self.frames_run / self.batches_run, 2) if self.batches_run else 0,
+            "frames_replaced": self.frames_replaced,
+            "pending": len(self._pending),
+        }
+
+    def _next_batch(self):
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+
+            # Give other streams a chance to join, up to the deadline of the oldest frame
+            while self._running and 0 < len(self._pending) < self.max_batch_size:
+                oldest = min(entry[2] for entry in self._pending.values())
+                remaining = oldest + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            if not self._running:
+                return []
+
+            # Oldest first so no stream starves when more than max_batch_size are waiting
+            ordered = sorted(self._pending.items(), key=lambda item: item[1][2])[:self.max_batch_size]
+            for stream_id, _ in ordered:
+                del self._pending[stream_id]
+            return ordered
+
+    def _run(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            # Streams discarded while their frame was queued have no context any more: drop the
+            # frame rather than bring the context (and a new tracker) back
+            contexts, live = [], []
+            for stream_id, entry in batch:
+                context = self.monitor.find_context(stream_id)
+                if context is None:
+                    for fut in entry[1]:
+                        if not fut.done():
+                            fut.set_exception(RuntimeError(f"Stream {stream_id} removed"))
+                    continue
+                contexts.append(context)
+                live.append((stream_id, entry))
+            if not live:
+                continue
+            batch = live
+            frames = [entry[0] for _, entry in batch]
+            try:
+                outputs = self.monitor.infer_batch(frames, contexts)
+            except Exception as e:
+                print(f"[SCHEDULER ERROR] {e}")
+                for _, entry in batch:
+                    for fut in entry[1]:
+                        fut.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.frames_run += len(frames)
+            finished = time.monotonic()
+            for context, (_, entry), output in zip(contexts, batch, outputs):
+                # Latency as the stream sees it: queued for the batch + the batch itself
+                context.record_inference(finished - entry[2])
+                for fut in entry[1]:
+                    fut.set_result(output)
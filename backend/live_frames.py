@@ -0,0 +1,79 @@
+import json
+import threading
+
+import time
+
+import cv2
+
+from metrics import stage_metrics
+
+
+class LiveFrame:
+    """One processed live frame, as published by a camera's FrameBroadcaster.
+
+    Detections are kept as data (`visuals` / `persons` from compute_compliance);
+    drawing and JPEG encoding only happen when a video client asks for them, and
+    each variant (annotated or raw, quality, width) is encoded once no matter how
+    many clients want it. Metadata-only clients never trigger either.
+    """
+
+    def __init__(self, cam_id, frame, visuals, persons, timestamp, draw_fn):
+        self.cam_id = cam_id
+        self.frame = frame
+        self.visuals = visuals
+        self.persons = persons
+        self.timestamp = timestamp
+        self._draw_fn = draw_fn
+        self._lock = threading.Lock()
+        self._annotated = None
+        self._jpegs = {}
+        self._metadata_json = None
+
+    def metadata(self):
+        h, w = self.frame.shape[:2]
+        return {
+            "cam_id": self.cam_id,
+            "t": round(self.timestamp, 3),
+            "size": [w, h],
+            "visuals": [
+                {"box": [int(v) for v in item['coords']], "label": item['text'], "color": list(item['color'])}
+                for item in self.visuals
+            ],
+            "persons": self.persons,
+        }
+
+    def metadata_json(self):
+        with self._lock:
+            if self._metadata_json is None:
+                self._metadata_json = json.dumps(self.metadata(), separators=(",", ":"))
+            return self._metadata_json
+
+    def annotated(self):
+        with self._lock:
+            if self._annotated is None:
+                if self.visuals:
+                    with stage_metrics.timer("draw_visuals", self.cam_id):
+                        self._annotated = self._draw_fn(self.frame.copy(), self.visuals)
+                else:
+                    self._annotated = self.frame
+            return self._annotated
+
+    def jpeg(self, annotated=True, quality=80, max_width=None):
+        """JPEG bytes of this frame, downscaled to max_width if it is wider"""
+        key = (annotated, quality, max_width)
+        with self._lock:
+            cached = self._jpegs.get(key)
+        if cached is not None:
+            return cached
+
+        image = self.annotated() if annotated else self.frame
+        started = time.perf_counter()
+        h, w = image.shape[:2]
+        if max_width and w > max_width:
+            image = cv2.resize(image, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        data = buffer.tobytes()
+        stage_metrics.observe("jpeg_encode", self.cam_id, time.perf_counter() - started)
+        with self._lock:
+            self._jpegs[key] = data
+        return data
@@ -1,18 +1,282 @@
+import base64
+import csv
+import io
 import json
-from sqlalchemy.orm import Session
+import queue
+import threading
+import time
+from sqlalchemy import select, tuple_
 from models import Log
+from gear_codes import encode_gear, decode_gear, masks_with
+from rollups import apply_rollups
+from metrics import stage_metrics
 from datetime import datetime
 
-def save_logs(db: Session, logs: list[dict], source: str):
-    """Persist detection logs to the database."""
-    for entry in logs:
-        log = Log(
-            person_id=entry.get("id"),
-            timestamp=datetime.fromisoformat(entry.get("timestamp")) if isinstance(entry.get("timestamp"), str) else datetime.now(),
-            detected=entry.get("detected", []),
-            missing=entry.get("missing", []),
-            source=source,
-            confidence=entry.get("confidence"),
-        )
-        db.add(log)
-    db.commit()
+def log_row(entry: dict, source: str) -> dict:
+    """Column values for one detection entry"""
+    return {
+        "person_id": entry.get("id"),
+        "timestamp": datetime.fromisoformat(entry.get("timestamp")) if isinstance(entry.get("timestamp"), str) else datetime.now(),
+        "detected_mask": encode_gear(entry.get("detected")),
+        "missing_mask": encode_gear(entry.get("missing")),
+        "is_violation": bool(entry.get("missing")),
+        "source": source,
+        "confidence": entry.get("confidence"),
+        "end_timestamp": datetime.fromisoformat(entry["end_timestamp"]) if isinstance(entry.get("end_timestamp"), str) else None,
+        "frame_count": entry.get("frame_count", 1),
+    }
+
+
+# --- QUERIES & EXPORT ---
+LOG_COLUMNS = (Log.id, Log.person_id, Log.timestamp, Log.detected_mask, Log.missing_mask,
+               Log.is_violation, Log.source, Log.confidence, Log.end_timestamp, Log.frame_count)
+EXPORT_CHUNK_ROWS = 1000
+
+
+def filter_logs(query, person_id=None, start=None, end=None, equipment=None, source=None, violations_only=False):
+    """Applies the /api/logs/search filters to a Query or select() (start/end: naive local datetimes)"""
+    if person_id is not None:
+        query = query.filter(Log.person_id == person_id)
+    if start is not None:
+        query = query.filter(Log.timestamp >= start)
+    if end is not None:
+        query = query.filter(Log.timestamp <= end)
+    if equipment:
+        # Gear is a bit in detected_mask / missing_mask: match the masks containing it (indexed IN lookups)
+        masks = masks_with(equipment)
+        query = query.filter(Log.detected_mask.in_(masks) | Log.missing_mask.in_(masks))
+    if source:
+        query = query.filter(Log.source == source)
+    if violations_only:
+        query = query.filter(Log.is_violation.is_(True))
+    return query
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """-> (timestamp, id) of the last row of the previous page; ValueError if malformed"""
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(query, cursor):
+    """Keyset condition for newest-first order: rows strictly older than (timestamp, id).
+
+    Served by ix_logs_timestamp, which already ends in the rowid (= id) on SQLite.
+    """
+    if not cursor:
+        return query
+    timestamp, log_id = decode_cursor(cursor)
+    return query.filter(tuple_(Log.timestamp, Log.id) < (timestamp, log_id))
+
+
+def log_dict(row) -> dict:
+    """API shape of one log row (ORM object or LOG_COLUMNS row)"""
+    return {
+        "id": row.id,
+        "person_id": row.person_id,
+        "timestamp": row.timestamp.isoformat(),
+        "detected": decode_gear(row.detected_mask),
+        "missing": decode_gear(row.missing_mask),
+        "source": row.source,
+        "confidence": row.confidence,
+        "end_timestamp": row.end_timestamp.isoformat() if row.end_timestamp else None,
+        "frame_count": row.frame_count,
+    }
+
+
+def _export_rows(session_factory, filters):
+    # Own session: the response body is streamed after the request's dependencies are closed
+    db = session_factory()
+    try:
+        stmt = filter_logs(select(*LOG_COLUMNS), **filters).order_by(Log.timestamp.desc(), Log.id.desc())
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def export_ndjson(session_factory, **filters):
+    """Yields the matching logs as newline-delimited JSON, one chunk of rows at a time"""
+    for partition in _export_rows(session_factory, filters):
+        yield "".join(json.dumps(log_dict(row)) + "\n" for row in partition)
+
+
+def export_csv(session_factory, **filters):
+    """Yields the matching logs as CSV (gear lists joined with ';'), one chunk of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["id", "person_id", "timestamp", "end_timestamp", "frame_count", "source", "status", "detected", "missing", "confidence"])
+    for partition in _export_rows(session_factory, filters):
+        for row in partition:
+            writer.writerow([
+                row.id, row.person_id, row.timestamp.isoformat(),
+                row.end_timestamp.isoformat() if row.end_timestamp else "", row.frame_count, row.source,
+                "VIOLATION" if row.is_violation else "COMPLIANT",
+                ";".join(decode_gear(row.detected_mask)), ";".join(decode_gear(row.missing_mask)),
+                "" if row.confidence is None else row.confidence,
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class LogWriter:
+    """Write-behind log sink: producers enqueue without blocking, one thread bulk-inserts.
+
+    Rows are flushed when `batch_size` are waiting or `flush_interval` seconds have
+    passed since the first one arrived. The queue is bounded; when it is full,
+    `policy` decides what happens to new rows:
+      - "drop_newest": discard the incoming rows (default; never stalls a camera loop)
+      - "drop_oldest": discard the oldest queued rows to make room
+      - "block":       wait for space (backpressure)
+    Callers can force backpressure per call with enqueue(..., block=True).
+    """
+
+    def __init__(self, session_factory, batch_size=500, flush_interval=1.0, max_queue=10000, policy="drop_newest"):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flushed = threading.Condition()
+        self._writing = False
+        self._thread = None
+
+        # Counters
+        self.rows_enqueued = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, logs: list[dict], source: str, block: bool = False):
+        """Queue detection entries for persistence. Returns how many were accepted."""
+        accepted = 0
+        for entry in logs:
+            row = log_row(entry, source)
+            if block or self.policy == "block":
+                self._queue.put(row)
+            else:
+                try:
+                    self._queue.put_nowait(row)
+                except queue.Full:
+                    if self.policy == "drop_oldest":
+                        try:
+                            self._queue.get_nowait()
+                            self.rows_dropped += 1
+                        except queue.Empty:
+                            pass
+                        try:
+                            self._queue.put_nowait(row)
+                        except queue.Full:
+                            self.rows_dropped += 1
+                            continue
+                    else:
+                        self.rows_dropped += 1
+                        continue
+            accepted += 1
+        self.rows_enqueued += accepted
+        return accepted
+
+    def _take_batch(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                # On shutdown, drain whatever is left without waiting
+                try:
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            db.bulk_insert_mappings(Log, rows)
+            # Rollups are updated in the same transaction, so they never drift from the logs
+            apply_rollups(db, rows)
+            db.commit()
+            self.rows_written += len(rows)
+            self.batches_written += 1
+            stage_metrics.observe("db_write", "log_writer", time.perf_counter() - started)
+        except Exception as e:
+            db.rollback()
+            self.write_errors += 1
+            self.rows_dropped += len(rows)
+            print(f"[LOG WRITER ERROR] {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            rows = self._take_batch()
+            if rows:
+                self._writing = True
+                self._write(rows)
+                self._writing = False
+            with self._flushed:
+                self._flushed.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Waits until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while (not self._queue.empty() or self._writing) and time.monotonic() < deadline:
+                self._flushed.wait(timeout=0.5)
+
+    def stop(self, timeout=10.0):
+        """Flushes pending rows and stops the writer thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        # Anything still queued (e.g. writer was never started) is written inline
+        leftover = []
+        try:
+            while True:
+                leftover.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        for i in range(0, len(leftover), self.batch_size):
+            self._write(leftover[i:i + self.batch_size])
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.rows_enqueued,
+            "written": self.rows_written,
+            "dropped": self.rows_dropped,
+            "batches": self.batches_written,
+            "errors": self.write_errors,
+        }
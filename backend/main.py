@@ -1,16 +1,34 @@
-from fastapi import FastAPI, Request, UploadFile, File
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, Request, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import cv2
+import torch
 import time
 import os
 import shutil
 import json
-from pydantic import BaseModel
+import tempfile
+from pydantic import BaseModel, Field, field_validator
 from safety_engine import SafetyMonitor
+from model_registry import model_registry
+from metrics import stage_metrics
+from inference_scheduler import InferenceScheduler
+from camera_capture import CameraCapture
+from stream_broadcaster import FrameBroadcaster
+from video_jobs import VideoJobQueue, JobCancelled
+from video_segments import analyze_parallel
+from video_pipeline import VideoPipeline
+from recent_events import RecentEvents
+from live_frames import LiveFrame
+from adaptive_stream import AdaptiveStreamClient, FRAME_HEADER
+from episodes import EpisodeAggregator
+from gear_codes import normalize_gear_names
+from fastapi.concurrency import run_in_threadpool
+import threading
+import asyncio
 
 # --- DATA MODELS ---
 class CameraConfig(BaseModel):
@@ -19,25 +37,76 @@ class CameraConfig(BaseModel):
     source: str # '0', '1', or URL
     type: str # 'webcam' or 'ip'
     zone: str = "General"
+    # Motion gate: skip inference on static scenes (e.g. empty corridors)
+    motion_gate: bool = False
+    motion_pixel_threshold: int = 25     # grey-level change per pixel
+    motion_area_threshold: float = 0.01  # fraction of changed pixels that counts as motion
+    # Inference region: ROI rectangles [x1, y1, x2, y2] and/or polygons [[x, y], ...] (pixels, or
+    # fractions of the frame when all values are <= 1) and the model input size (longer side, px)
+    rois: list[list[float] | list[list[float]]] = []
+    inference_size: int | None = None
+
+# --- INFERENCE BACKEND ---
+# 'pytorch' (default), 'onnx' (ONNX Runtime) or 'openvino'; exported models are created on first start
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch")
+INFERENCE_INT8 = os.environ.get("INFERENCE_INT8", "0") == "1"
+INFERENCE_SELF_CHECK = os.environ.get("INFERENCE_SELF_CHECK", "1") == "1"
+# Site image for the export self-check (a frame with people and PPE in it); defaults to ultralytics' bus.jpg
+INFERENCE_SELF_CHECK_IMAGE = os.environ.get("INFERENCE_SELF_CHECK_IMAGE") or None
+# PPE stage: 'full' frame, person 'crops' or union 'roi' (skipped entirely when nobody is in view)
+PPE_MODE = os.environ.get("PPE_MODE", "full")
+# Models load once per process: at 'startup' (in lifespan) or 'lazy' on the first frame
+MODEL_LOADING = os.environ.get("MODEL_LOADING", "startup")
+# Warm-up inference size, i.e. the size production frames are run at (0 disables warm-up)
+MODEL_WARMUP_IMGSZ = int(os.environ.get("MODEL_WARMUP_IMGSZ", 640))
+
+def create_monitor():
+    return SafetyMonitor(backend=INFERENCE_BACKEND, int8=INFERENCE_INT8, self_check=INFERENCE_SELF_CHECK,
+                         self_check_sample=INFERENCE_SELF_CHECK_IMAGE, ppe_mode=PPE_MODE,
+                         lazy=MODEL_LOADING == "lazy", warmup_imgsz=MODEL_WARMUP_IMGSZ or None)
 
 # --- GLOBAL STATE ---
-monitor = SafetyMonitor()
+monitor = None           # SafetyMonitor, created in lifespan (not at import, so reloads don't load models twice)
 OUTPUT_DIR = "static"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
-DETECTION_LOGS_LIMIT = 500
-detection_logs = []
-ACTIVE_CAMERAS = {}      # cam_id -> cv2.VideoCapture
+DETECTION_LOGS_LIMIT = int(os.environ.get("DETECTION_LOGS_LIMIT", 500))
+detection_logs = RecentEvents(capacity=DETECTION_LOGS_LIMIT)   # latest live entries (ring buffer + running counters)
+ACTIVE_CAMERAS = {}      # cam_id -> CameraCapture (background reader, newest frame only)
 CAMERA_METADATA = []     # list of CameraConfig
-LAST_LOG_TIME = {}       # (source, person_id) -> timestamp
-LOG_COOLDOWN_SECONDS = 10 # Only log same person/violation once every 10s
+BROADCASTERS = {}        # cam_id -> FrameBroadcaster (one inference/encode loop per camera)
+BROADCASTERS_LOCK = threading.Lock()
+VIDEO_SOCKETS = {}       # cam_id -> set of AdaptiveStreamClient (WebSocket viewers)
+WS_TARGET_KBPS = 1500    # default per-client bitrate target for /ws/video
+WS_MAX_IN_FLIGHT = 2     # unacknowledged frames before a client's frames are skipped
+# Per-frame person results are folded into episodes (one log row per person per status span)
+EPISODE_LOST_AFTER = 2.0  # seconds a track may go unseen before its episode is closed
+episodes = EpisodeAggregator(lost_after=EPISODE_LOST_AFTER)   # live cameras, keyed by cam_id
+
+# Cross-camera batching: one pose + PPE call covers every live camera
+INFERENCE_MAX_BATCH = 16     # max frames per model call
+INFERENCE_MAX_WAIT_MS = 15   # max time a frame waits for others to join its batch
+scheduler = None
+
+# Uploaded videos are analyzed as background jobs (one model instance is shared, so keep this small)
+VIDEO_JOB_WORKERS = 1
+# Bounded queues between the decode -> infer -> encode threads of a job
+PIPELINE_DECODE_QUEUE = 16
+PIPELINE_ENCODE_QUEUE = 16
+# Worker processes for parallel=True jobs (each loads its own model instance)
+VIDEO_SEGMENT_WORKERS = int(os.environ.get("VIDEO_SEGMENT_WORKERS", max((os.cpu_count() or 2) // 2, 1)))
 
 # --- LIFESPAN MANAGER ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global monitor
-    print("[INFO] Initializing Safety Monitor (GPU)...")
-    monitor = SafetyMonitor()
+    global monitor, scheduler
+    print(f"[INFO] Initializing Safety Monitor (models: {MODEL_LOADING})...")
+    monitor = create_monitor()
     monitor.set_active(True)
+
+    scheduler = InferenceScheduler(monitor, max_batch_size=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS)
+    scheduler.start()
+    log_writer.start()
+    db_maintenance.start()
     
     # Initialize with default webcam if none exist
     # (Actually let's wait for user to add)
@@ -45,9 +114,19 @@ async def lifespan(app: FastAPI):
     yield
     
     print("[INFO] Shutdown cleanup...")
+    video_jobs.shutdown()
+    for broadcaster in BROADCASTERS.values():
+        broadcaster.close()
+    BROADCASTERS.clear()
+    scheduler.stop()
     for cam_id, cam in ACTIVE_CAMERAS.items():
         cam.release()
     ACTIVE_CAMERAS.clear()
+    # Flush open episodes and queued detection logs before exit
+    for cam_id, closed in episodes.flush().items():
+        log_writer.enqueue(violations(closed), source=camera_name(cam_id))
+    log_writer.stop()
+    db_maintenance.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -87,10 +166,21 @@ async def add_camera(cam: CameraConfig):
                 cap = try_source(test_url)
                 if cap:
                     cam.source = test_url # Update to working URL
+                    source = test_url
                     break
 
         if cap:
-            ACTIVE_CAMERAS[cam_id] = cap
+            context = monitor.get_context(cam_id)
+            try:
+                configure_camera_region(context, cap, cam.rois, cam.inference_size)
+            except ValueError as e:
+                cap.release()
+                monitor.release_context(cam_id)
+                return {"status": "error", "message": f"Invalid inference region: {e}"}
+            ACTIVE_CAMERAS[cam_id] = CameraCapture(cap, source, name=cam_id)
+            context.configure_motion_gate(
+                cam.motion_gate, cam.motion_pixel_threshold, cam.motion_area_threshold
+            )
             CAMERA_METADATA.append(cam)
             return {"status": "success", "camera": cam}
         else:
@@ -102,12 +192,79 @@ async def add_camera(cam: CameraConfig):
 async def delete_camera(cam_id: str):
     global CAMERA_METADATA
     if cam_id in ACTIVE_CAMERAS:
+        with BROADCASTERS_LOCK:
+            broadcaster = BROADCASTERS.pop(cam_id, None)
+        if broadcaster:
+            broadcaster.close()
+        close_camera_episodes(cam_id)
         ACTIVE_CAMERAS[cam_id].release()
         del ACTIVE_CAMERAS[cam_id]
+        if scheduler:
+            scheduler.discard(cam_id)
+        stage_metrics.forget(cam_id)
         CAMERA_METADATA = [c for c in CAMERA_METADATA if c.id != cam_id]
         return {"status": "success"}
     return {"status": "error", "message": "Camera not found"}
 
+class MotionGateSettings(BaseModel):
+    enabled: bool
+    pixel_threshold: int | None = None
+    area_threshold: float | None = None
+    max_static_frames: int | None = None
+
+class RegionSettings(BaseModel):
+    rois: list[list[float] | list[list[float]]] = []
+    inference_size: int | None = None
+
+def configure_camera_region(context, cap, rois, inference_size):
+    """Applies ROIs / inference size to a camera's context, checked against the capture's frame size"""
+    context.configure_region(rois, inference_size)
+    if context.region is not None:
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width and height:
+            context.region.validate(width, height)
+
+@app.get("/api/cameras/{cam_id}/inference")
+async def get_camera_inference(cam_id: str):
+    """Per-camera skip/motion-gate settings and how many inferences were run or skipped"""
+    if cam_id not in ACTIVE_CAMERAS:
+        return {"status": "error", "message": "Camera not found"}
+    return monitor.get_context(cam_id).stats()
+
+@app.post("/api/cameras/{cam_id}/motion")
+async def set_camera_motion_gate(cam_id: str, settings: MotionGateSettings):
+    if cam_id not in ACTIVE_CAMERAS:
+        return {"status": "error", "message": "Camera not found"}
+    monitor.get_context(cam_id).configure_motion_gate(
+        settings.enabled, settings.pixel_threshold, settings.area_threshold, settings.max_static_frames
+    )
+    for cam in CAMERA_METADATA:
+        if cam.id == cam_id:
+            cam.motion_gate = settings.enabled
+            if settings.pixel_threshold is not None:
+                cam.motion_pixel_threshold = settings.pixel_threshold
+            if settings.area_threshold is not None:
+                cam.motion_area_threshold = settings.area_threshold
+    return {"status": "updated", "motion_gate": monitor.get_context(cam_id).stats()["motion_gate"]}
+
+@app.post("/api/cameras/{cam_id}/region")
+async def set_camera_region(cam_id: str, settings: RegionSettings):
+    """Restricts a camera's inference to ROIs and/or a smaller model input size (empty for the full frame)"""
+    if cam_id not in ACTIVE_CAMERAS:
+        return {"status": "error", "message": "Camera not found"}
+    context = monitor.get_context(cam_id)
+    previous = context.region
+    try:
+        configure_camera_region(context, ACTIVE_CAMERAS[cam_id].cap, settings.rois, settings.inference_size)
+    except ValueError as e:
+        context.region = previous
+        return {"status": "error", "message": f"Invalid inference region: {e}"}
+    for cam in CAMERA_METADATA:
+        if cam.id == cam_id:
+            cam.rois = settings.rois
+            cam.inference_size = settings.inference_size
+    return {"status": "updated", "region": context.stats()["region"]}
+
 # --- CORS MIDDLEWARE (Required for Next.js frontend) ---
 app.add_middleware(
     CORSMiddleware,
@@ -134,9 +291,20 @@ class ThresholdSettings(BaseModel):
 class GearSettings(BaseModel):
     requirements: list[str]
 
+    @field_validator("requirements")
+    @classmethod
+    def known_gear(cls, value):
+        # Unknown names would never match a detection (and can't be stored): 422 instead
+        return normalize_gear_names(value)
+
 class MonitorState(BaseModel):
     active: bool
 
+class SkipSettings(BaseModel):
+    adaptive: bool
+    skip_frames: int | None = Field(None, ge=0, le=10)   # same bounds as the adaptive controller
+    target_fps: float | None = Field(None, gt=0)
+
 # --- API ENDPOINTS ---
 
 # 1. Monitoring Toggle
@@ -180,340 +348,533 @@ async def get_gear_settings():
         return {"requirements": list(monitor.REQUIRED_GEAR)}
     return {"requirements": []}
 
+# 4. Frame Skipping (fixed interval or adaptive to a target FPS)
+@app.post("/api/settings/skip")
+async def set_skip(settings: SkipSettings):
+    if monitor:
+        monitor.set_skip_mode(settings.adaptive, settings.skip_frames, settings.target_fps)
+    return {"status": "updated", "adaptive": settings.adaptive}
+
+@app.get("/api/settings/skip")
+async def get_skip_settings():
+    """Returns the skip mode and the effective skip interval of every camera"""
+    if not monitor:
+        return {"adaptive": False, "skip_frames": 2, "cameras": {}}
+    return {
+        "adaptive": monitor.adaptive_skip,
+        "skip_frames": monitor.SKIP_FRAMES,
+        "target_fps": monitor.target_fps,
+        "cameras": {
+            cam_id: {
+                "skip_frames": monitor.get_context(cam_id).SKIP_FRAMES,
+                "inference_ms": monitor.get_context(cam_id).stats()["inference_ms"],
+            }
+            for cam_id in ACTIVE_CAMERAS
+        },
+    }
+
 # --- DASHBOARD API ---
 @app.get("/api/dashboard/summary")
 async def get_dashboard_summary():
-    # Reuse existing stats logic
-    recent_logs = detection_logs[-50:]
-    violations = len([d for d in recent_logs if d['status'] == 'VIOLATION'])
-    total = len(recent_logs)
-    compliance = ((total - violations) / total) * 100 if total > 0 else 100
+    # Running counters over the recent-events buffer
+    counts = detection_logs.counts()
     
     return {
-        "activeViolations": violations,
+        "activeViolations": counts["violations"],
         "camerasOnline": len(ACTIVE_CAMERAS),
-        "complianceScore": round(compliance, 1),
+        "complianceScore": counts["compliance_rate"],
         "averageResponseTime": 1.2 # Placeholder
     }
 
 @app.get("/api/dashboard/violations")
 async def get_dashboard_violations(limit: int = 5):
-    # Filter logs for violations
-    v_logs = [l for l in detection_logs if l.get('status') == 'VIOLATION'][::-1]
-    return v_logs[:limit]
+    return detection_logs.latest_violations(limit)
 
 @app.get("/api/dashboard/system-status")
 async def get_dashboard_system_status():
     return {
         "status": "online",
         "monitor_active": monitor.is_active if monitor else False,
+        "inference_backend": monitor.backend if monitor else None,
         "gpu_available": torch.cuda.is_available(),
-        "storage_usage": "2.4GB" # Placeholder
+        "storage_usage": format_bytes(storage_usage_bytes())
     }
 
+def storage_usage_bytes():
+    """Disk used by processed videos/thumbnails and the log database (incl. WAL)"""
+    total = 0
+    for entry in os.scandir(OUTPUT_DIR):
+        if entry.is_file():
+            total += entry.stat().st_size
+    for suffix in ("", "-wal", "-shm"):
+        path = DB_PATH + suffix
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+
 @app.get("/api/dashboard/activity")
 async def get_dashboard_activity(limit: int = 4):
-    return detection_logs[::-1][:limit]
+    return detection_logs.latest(limit)
 
-from database import engine, Base, get_db
-from models import Log
-from log_service import save_logs
+from database import engine, Base, get_read_db, SessionLocal, ReadSessionLocal, init_database, DatabaseMaintenance, DB_PROFILE, DB_PATH
+from models import Log, ProcessedVideo
+from log_service import LogWriter, LOG_COLUMNS, filter_logs, after_cursor, encode_cursor, log_dict, export_csv, export_ndjson
+from db_migrations import run_migrations
+from rollups import summarize
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from datetime import datetime
 
-# Ensure tables exist
+# Ensure tables exist (and apply the persistent SQLite settings of DB_PROFILE)
+init_database()
 Base.metadata.create_all(bind=engine)
+run_migrations(engine, output_dir=OUTPUT_DIR)
+db_maintenance = DatabaseMaintenance()
+
+# Write-behind persistence: frame loops enqueue, one thread bulk-inserts
+LOG_BATCH_SIZE = 500          # rows per INSERT/commit
+LOG_FLUSH_INTERVAL = 1.0      # seconds before a partial batch is written
+LOG_QUEUE_MAX = 10000         # bounded queue; live rows are dropped (and counted) beyond this
+log_writer = LogWriter(SessionLocal, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL, max_queue=LOG_QUEUE_MAX)
+
+def local_naive(value):
+    """Timezone-aware datetimes -> naive local time, the way log timestamps are stored"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+# New endpoint: search logs in DB (newest first, keyset-paginated on (timestamp, id))
+SEARCH_PAGE_MAX = 1000
 
-# New endpoint: search logs in DB
 @app.get("/api/logs/search")
 async def search_logs(
     person_id: int | None = None,
-    start: str | None = None,
-    end: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
     equipment: str | None = None,
-    db: Session = Depends(get_db),
+    source: str | None = None,
+    violations_only: bool = False,
+    limit: int = 200,
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
 ):
-    query = db.query(Log)
-    if person_id is not None:
-        query = query.filter(Log.person_id == person_id)
-    if start:
-        query = query.filter(Log.timestamp >= datetime.fromisoformat(start))
-    if end:
-        query = query.filter(Log.timestamp <= datetime.fromisoformat(end))
-    if equipment:
-        # search in detected or missing JSON arrays
-        query = query.filter(
-            Log.detected.contains([equipment]) | Log.missing.contains([equipment])
-        )
-    results = query.order_by(Log.timestamp.desc()).limit(200).all()
-    # Convert to serializable dicts
-    logs = []
-    for r in results:
-        logs.append(
-            {
-                "id": r.id,
-                "person_id": r.person_id,
-                "timestamp": r.timestamp.isoformat(),
-                "detected": r.detected,
-                "missing": r.missing,
-                "source": r.source,
-                "confidence": r.confidence,
-            }
-        )
-    return {"logs": logs}
-
-# New endpoint: analytics summary
-@app.get("/api/analytics/summary")
-async def analytics_summary(db: Session = Depends(get_db)):
-    from sqlalchemy import func, json_each, cast, Date
-    
-    # 1. Equipment Counts
-    detected_counts = (
-        db.query(json_each.value, func.count())
-        .select_from(Log, func.json_each(Log.detected))
-        .group_by(json_each.value).all()
-    )
-    missing_counts = (
-        db.query(json_each.value, func.count())
-        .select_from(Log, func.json_each(Log.missing))
-        .group_by(json_each.value).all()
-    )
-
-    # 2. Violation Trend (Daily)
-    # We count logs that have non-empty 'missing' list as violations
-    # Note: SQLite json_array_length or similar can be used if supported, 
-    # but let's do a simpler approach: count all logs per day for now, 
-    # or filter logs in memory if DB volume is small.
-    # For robust SQLite counting of JSON arrays:
-    violation_trend = (
-        db.query(cast(Log.timestamp, Date), func.count(Log.id))
-        .filter(func.json_array_length(Log.missing) > 0)
-        .group_by(cast(Log.timestamp, Date))
-        .order_by(cast(Log.timestamp, Date))
-        .all()
-    )
+    limit = min(max(limit, 1), SEARCH_PAGE_MAX)
+    # FastAPI answers malformed dates with a 422
+    query = filter_logs(db.query(*LOG_COLUMNS), person_id, local_naive(start), local_naive(end), equipment, source, violations_only)
+    try:
+        query = after_cursor(query, cursor)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
 
-    # 3. Compliance Score Trend (Daily)
-    # Score = (Total - Violations) / Total * 100
-    daily_stats = (
-        db.query(
-            cast(Log.timestamp, Date),
-            func.count(Log.id).label("total"),
-            func.sum(func.case((func.json_array_length(Log.missing) > 0, 1), else_=0)).label("violations")
-        )
-        .group_by(cast(Log.timestamp, Date))
-        .order_by(cast(Log.timestamp, Date))
-        .all()
-    )
+    # One extra row tells us whether there is a next page
+    rows = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    return {"logs": [log_dict(r) for r in rows], "next_cursor": next_cursor}
 
-    # 4. Camera Performance
-    camera_stats = (
-        db.query(Log.source, func.count(Log.id))
-        .filter(func.json_array_length(Log.missing) > 0)
-        .group_by(Log.source)
-        .all()
-    )
+@app.get("/api/logs/export")
+async def export_logs(
+    format: str = "ndjson",
+    person_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    equipment: str | None = None,
+    source: str | None = None,
+    violations_only: bool = False,
+):
+    """Streams every matching log (newest first) without loading them into memory"""
+    # Dates are parsed (422 if malformed) before the 200 headers of the stream go out
+    filters = dict(person_id=person_id, start=local_naive(start), end=local_naive(end), equipment=equipment,
+                   source=source, violations_only=violations_only)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if format == "csv":
+        return StreamingResponse(export_csv(ReadSessionLocal, **filters), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="logs_{stamp}.csv"'})
+    if format == "ndjson":
+        return StreamingResponse(export_ndjson(ReadSessionLocal, **filters), media_type="application/x-ndjson",
+                                 headers={"Content-Disposition": f'attachment; filename="logs_{stamp}.ndjson"'})
+    return {"status": "error", "message": "format must be 'ndjson' or 'csv'"}
 
-    return {
-        "detected": {item: cnt for item, cnt in detected_counts},
-        "missing": {item: cnt for item, cnt in missing_counts},
-        "violationTrend": [{"date": str(d), "violations": c} for d, c in violation_trend],
-        "complianceTrend": [
-            {"date": str(d), "score": round(((t - v) / t) * 100, 1) if t > 0 else 100} 
-            for d, t, v in daily_stats
-        ],
-        "cameraPerformance": [{"camera": s, "violations": c} for s, c in camera_stats]
-    }
+# New endpoint: analytics summary (served from the hourly/daily rollup tables)
+@app.get("/api/analytics/summary")
+async def analytics_summary(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    camera: str | None = None,
+    db: Session = Depends(get_read_db),
+):
+    # FastAPI answers malformed dates with a 422; timestamps are stored as naive local time
+    return summarize(db, start=local_naive(start), end=local_naive(end), source=camera)
 
 # Original Logs & Stats (kept for compatibility)
 @app.get("/api/logs")
 async def get_logs():
-    return {"logs": detection_logs[::-1]}
+    return {"logs": detection_logs.latest()}
 
 @app.get("/api/stats")
 async def get_stats():
-    if not detection_logs:
-        return {"total_violations": 0, "compliance_rate": 100}
-    recent_logs = detection_logs[-50:]
-    violations = len([d for d in recent_logs if d['status'] == 'VIOLATION'])
-    total = len(recent_logs)
-    compliance = ((total - violations) / total) * 100 if total > 0 else 100
-    return {"total_violations": violations, "compliance_rate": round(compliance, 1)}
+    counts = detection_logs.counts()
+    return {"total_violations": counts["violations"], "compliance_rate": counts["compliance_rate"]}
 
 # --- LIVE STREAMING LOGIC --
-def generate_frames(cam_id: str):
-    while True:
-        # 1. Check if camera is accessible
-        if cam_id not in ACTIVE_CAMERAS:
-            print(f"[ERROR] Camera {cam_id} not initialized")
-            break
-            
-        cap = ACTIVE_CAMERAS[cam_id]
-        success, frame = cap.read()
-        
-        if not success:
-            # Maybe it's an IP cam that disconnected?
-            time.sleep(1)
-            continue
+def process_camera_frame(cam_id: str, frame):
+    """Inference and logging for one live frame (runs once per frame, shared by all viewers).
 
-        try:
-            # Get metadata for source name
-            cam_name = "Camera"
-            for m in CAMERA_METADATA:
-                if m.id == cam_id:
-                    cam_name = m.name
-                    break
+    Returns a LiveFrame; drawing and JPEG encoding are left to the clients that need them.
+    """
+    captured_at = time.time()
+    started = time.perf_counter()
+    # Per-stream tracker, skip counter & detection cache (models are shared)
+    context = monitor.get_context(cam_id)
+
+    cam_name = camera_name(cam_id)
+
+    # 3. Live Inference (batched with the other cameras by the scheduler)
+    if monitor.is_active:
+        if context.next_frame(frame):
+            scheduler.infer(cam_id, frame)
+        with stage_metrics.timer("compute_compliance", cam_id):
+            visuals, data = monitor.compute_compliance(context.last_pose_data, context.last_equip_data)
+    else:
+        visuals, data = [], []
+    
+    # 4. Episodes: new violations show up on the dashboard right away, finished ones are persisted.
+    # Compliant episodes are tracked (they end a violation) but, as before, live only in memory
+    opened, closed = episodes.update(cam_id, data, time.time())
+    opened, closed = violations(opened), violations(closed)
+    if opened:
+        detection_logs.add(opened)
+    if closed:
+        # PERSIST TO DATABASE (write-behind, never blocks the frame loop)
+        log_writer.enqueue(closed, source=cam_name)
+
+    stage_metrics.observe("process", cam_id, time.perf_counter() - started)
+    stage_metrics.tick(cam_id)
+    return LiveFrame(cam_id, frame, visuals, data, captured_at, monitor.draw_visuals)
+
+def camera_name(cam_id: str):
+    """Source name logs are stored under"""
+    for m in CAMERA_METADATA:
+        if m.id == cam_id:
+            return m.name
+    return "Camera"
 
-            # 3. Live Inference
-            annotated_frame, data = monitor.process_frame(frame)
-            
-            # 4. Filter and Update Logs with cooldown
-            filtered_data = []
-            now = time.time()
-            if data:
-                for entry in data:
-                    person_id = entry.get("id")
-                    key = (cam_name, person_id)
-                    
-                    # Only log if it's a violation AND outside cooldown
-                    if entry.get("status") == "VIOLATION":
-                         last_time = LAST_LOG_TIME.get(key, 0)
-                         if now - last_time > LOG_COOLDOWN_SECONDS:
-                             filtered_data.append(entry)
-                             LAST_LOG_TIME[key] = now
-                    else:
-                        # SAFE logs are less noisy, but maybe we don't even need them in DB?
-                        # For now, let's keep them transient in memory only
-                        pass
-
-                if filtered_data:
-                    detection_logs.extend(filtered_data)
-                    if len(detection_logs) > 50: detection_logs.pop(0)
-                    
-                    # PERSIST TO DATABASE
-                    try:
-                        with next(get_db()) as db:
-                            save_logs(db, filtered_data, source=cam_name)
-                    except Exception as db_err:
-                        print(f"Stats DB Error: {db_err}")
-
-            # 5. Encode & Stream
-            ret, buffer = cv2.imencode('.jpg', annotated_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                   
-        except Exception as e:
-            print(f"[STREAM ERROR] {e}")
-            break
+def violations(episode_list):
+    """Live cameras only log violation episodes (uploads keep every episode)"""
+    return [e for e in episode_list if e.get("status") == "VIOLATION"]
+
+def close_camera_episodes(cam_id: str):
+    """Persists a camera's open violation episodes (stream stopped or camera removed)"""
+    for closed in episodes.flush(cam_id).values():
+        log_writer.enqueue(violations(closed), source=camera_name(cam_id))
+
+def get_broadcaster(cam_id: str):
+    """Returns the camera's shared broadcaster, creating it for the first viewer"""
+    with BROADCASTERS_LOCK:
+        broadcaster = BROADCASTERS.get(cam_id)
+        if broadcaster is None or broadcaster.is_closed():
+            broadcaster = FrameBroadcaster(cam_id, ACTIVE_CAMERAS[cam_id], lambda frame: process_camera_frame(cam_id, frame),
+                                           on_stop=lambda: close_camera_episodes(cam_id))
+            BROADCASTERS[cam_id] = broadcaster
+        return broadcaster
+
+def generate_frames(cam_id: str, annotated: bool = True, max_fps: float | None = None):
+    # 1. Check if camera is accessible
+    if cam_id not in ACTIVE_CAMERAS:
+        print(f"[ERROR] Camera {cam_id} not initialized")
+        return
+
+    # 2. Subscribe to the shared stream; slow clients just skip to the newest frame
+    min_interval = 1.0 / max_fps if max_fps else 0.0
+    last_sent = 0.0
+    for live in get_broadcaster(cam_id).subscribe():
+        if min_interval and live.timestamp - last_sent < min_interval:
+            continue
+        last_sent = live.timestamp
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + live.jpeg(annotated=annotated) + b'\r\n')
 
 @app.get("/video_feed/{cam_id}")
-async def video_feed(cam_id: str):
-    return StreamingResponse(generate_frames(cam_id), media_type="multipart/x-mixed-replace; boundary=frame")
+async def video_feed(cam_id: str, annotated: bool = True, max_fps: float | None = None):
+    """MJPEG stream. annotated=false sends the raw frames (e.g. with overlays drawn client-side
+    from /api/cameras/{cam_id}/detections); max_fps caps the rate for a low-rate preview."""
+    return StreamingResponse(generate_frames(cam_id, annotated, max_fps), media_type="multipart/x-mixed-replace; boundary=frame")
 
-# --- RECORDED VIDEO PROCESSING ---
-from fastapi import Form
-@app.post("/analyze_video")
-async def analyze_video(
-    file: UploadFile = File(...),
-    start_time: float = Form(0.0),
-    end_time: float = Form(None),
-    required_gear: str = Form(None)
-):
-    # Parse required gear if provided
-    active_requirements = None
-    if required_gear:
+def generate_detection_events(cam_id: str):
+    for live in get_broadcaster(cam_id).subscribe():
+        yield f"data: {live.metadata_json()}\n\n"
+
+@app.get("/api/cameras/{cam_id}/detections")
+async def camera_detections(cam_id: str):
+    """Server-sent events with each processed frame's boxes, labels and person results (no image)"""
+    if cam_id not in ACTIVE_CAMERAS:
+        return {"status": "error", "message": "Camera not found"}
+    return StreamingResponse(
+        generate_detection_events(cam_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/video/{cam_id}")
+async def video_socket(websocket: WebSocket, cam_id: str, target_kbps: int = WS_TARGET_KBPS, annotated: bool = True):
+    """Binary JPEG frames with acknowledgements and per-client adaptive quality.
+
+    Each binary message is FRAME_HEADER (seq, capture time) + JPEG. The client answers
+    {"ack": seq}; frames are skipped while too many are unacknowledged, and quality /
+    resolution follow the client's delivered bitrate (see adaptive_stream). A text
+    {"type": "stats", ...} message is sent whenever the quality level changes.
+    """
+    await websocket.accept()
+    if cam_id not in ACTIVE_CAMERAS:
+        await websocket.close(code=4404, reason="Camera not found")
+        return
+
+    client = AdaptiveStreamClient(cam_id, target_kbps=target_kbps, max_in_flight=WS_MAX_IN_FLIGHT)
+    VIDEO_SOCKETS.setdefault(cam_id, set()).add(client)
+    frames = get_broadcaster(cam_id).subscribe()
+
+    async def receive_acks():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            # Anything but {"ack": <int>} is ignored; a dead ack reader would stall the sender
+            try:
+                payload = json.loads(message.get("text") or "null")
+                if isinstance(payload, dict) and "ack" in payload:
+                    client.on_ack(int(payload["ack"]))
+            except (TypeError, ValueError):
+                continue
+
+    acks = asyncio.create_task(receive_acks())
+    try:
+        while not acks.done():
+            live = await run_in_threadpool(next, frames, None)
+            if live is None:
+                break
+            if not client.can_send():
+                client.on_skipped()
+            else:
+                quality, max_width = client.encode_params()
+                data = await run_in_threadpool(live.jpeg, annotated, quality, max_width)
+                seq = client.on_sent(len(data))
+                await websocket.send_bytes(FRAME_HEADER.pack(seq, live.timestamp) + data)
+            if client.adapt():
+                await websocket.send_json({"type": "stats", **client.stats()})
+        if acks.done() and not acks.cancelled() and acks.exception() is not None:
+            # Without acks nothing more can be sent: end the stream instead of leaving it hanging
+            print(f"[WARNING] WebSocket {cam_id}: ack reader failed: {acks.exception()}")
+            await websocket.close(code=1011)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        acks.cancel()
         try:
-            active_requirements = json.loads(required_gear)
-        except:
-            # Fallback to comma-separated if not valid JSON
-            active_requirements = [g.strip().lower() for g in required_gear.split(",")]
-    
-    # 1. Save Uploaded File
-    temp_input = f"{OUTPUT_DIR}/temp_input.mp4"
-    
-    output_filename = f"processed_{int(time.time())}.webm"
+            frames.close()
+        except ValueError:
+            pass  # still running in a worker thread after a disconnect; closed when collected
+        VIDEO_SOCKETS.get(cam_id, set()).discard(client)
+
+@app.get("/api/cameras/{cam_id}/clients")
+async def get_camera_clients(cam_id: str):
+    """Per-client delivery stats of the camera's WebSocket viewers"""
+    return {"clients": [client.stats() for client in list(VIDEO_SOCKETS.get(cam_id, ()))]}
+
+# --- RECORDED VIDEO PROCESSING ---
+def parse_required_gear(required_gear: str | None):
+    """JSON list or comma-separated names -> lower-case gear names (None: use the global setting).
+
+    Raises ValueError if the value isn't a list of known gear names.
+    """
+    if not required_gear:
+        return None
+    try:
+        names = json.loads(required_gear)
+    except ValueError:
+        # Fallback to comma-separated if not valid JSON
+        names = [g for g in required_gear.split(",") if g.strip()]
+    return normalize_gear_names(names)
+
+def run_video_analysis(job, input_path: str, start_time: float, end_time: float | None, active_requirements, parallel: bool = False):
+    """Decode -> process_frame -> VideoWriter for one uploaded video (runs on a job worker).
+
+    Decoding, inference and encoding run as a pipeline (see video_pipeline). With
+    parallel=True the range is instead split into segments processed on a process
+    pool (see video_segments.analyze_parallel).
+    """
+    output_filename = f"processed_{int(time.time())}_{job.id}.webm"
     output_path = f"{OUTPUT_DIR}/{output_filename}"
 
-    with open(temp_input, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # 2. Setup Processing
-    cap = cv2.VideoCapture(temp_input)
+    # 1. Setup Processing
+    cap = cv2.VideoCapture(input_path)
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    video_duration_ms = (total_frames / fps) * 1000 if fps > 0 else 0
+
+    # Frame range [start_frame, end_frame), precomputed instead of checking POS_MSEC every frame
+    start_frame = int(start_time * fps) if fps > 0 else 0
+    end_frame = total_frames if total_frames > 0 else None
+    if end_time is not None and fps > 0:
+        last = int(end_time * fps) + 1
+        end_frame = min(end_frame, last) if end_frame is not None else last
+    frames_in_range = max(end_frame - start_frame, 0) if end_frame is not None else None
 
     # Seek to start time
-    start_ms = start_time * 1000
-    cap.set(cv2.CAP_PROP_POS_MSEC, start_ms)
-    
-    end_ms = end_time * 1000 if end_time is not None else video_duration_ms
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    job.update_progress(0, frames_in_range or 0)
     
     # Use original dimensions
     orig_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     orig_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
     # CHANGE: Use 'vp80' (VP8) - Faster & better compatibility than VP9
-    try:
-        fourcc = cv2.VideoWriter_fourcc(*'vp80')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (orig_width, orig_height))
-        
-        # Critical Check: Did the writer actually open?
-        if not out.isOpened():
-            print("[WARNING] VP8 codec failed. Falling back to mp4v...")
-            output_filename = f"processed_{int(time.time())}.mp4"
-            output_path = f"{OUTPUT_DIR}/{output_filename}"
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (orig_width, orig_height))
-            
-    except Exception as e:
-        print(f"[ERROR] Video Writer Error: {e}")
-        return {"status": "Error", "message": str(e)}
+    codec = 'vp80'
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (orig_width, orig_height))
     
-    # Temporarily force monitor active
-    was_active = monitor.is_active
-    monitor.set_active(True)
+    # Critical Check: Did the writer actually open?
+    if not out.isOpened():
+        print("[WARNING] VP8 codec failed. Falling back to mp4v...")
+        output_filename = f"processed_{int(time.time())}_{job.id}.mp4"
+        output_path = f"{OUTPUT_DIR}/{output_filename}"
+        codec = 'mp4v'
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (orig_width, orig_height))
 
-    results = []
-    frame_count = 0
+    thumb_filename = f"thumb_{output_filename}.jpg"
     first_frame_thumb = None
-    
-    # 3. Process Frame by Frame
-    while cap.isOpened():
-        current_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
-        if current_ms > end_ms:
-            break
 
+    if parallel and VIDEO_SEGMENT_WORKERS > 1 and end_frame is not None:
+        # Segments write their own files; the writer above only picked the codec
+        cap.release()
+        out.release()
+        try:
+            frame_count, results = analyze_parallel(
+                job, input_path, output_path, codec,
+                start_frame=start_frame,
+                end_frame=end_frame,
+                fps=fps, size=(orig_width, orig_height),
+                # Workers have their own SafetyMonitor: hand them the runtime gear rules and thresholds
+                requirements=active_requirements if active_requirements is not None else sorted(monitor.REQUIRED_GEAR),
+                thumbnail_path=f"{OUTPUT_DIR}/{thumb_filename}",
+                monitor_kwargs=dict(backend=monitor.backend, int8=monitor.int8, self_check=False, ppe_mode=monitor.ppe_mode),
+                settings={
+                    'general_conf': monitor.general_conf,
+                    'skip_frames': monitor.SKIP_FRAMES,
+                    'adaptive_skip': monitor.adaptive_skip,
+                    'target_fps': monitor.target_fps,
+                    'class_thresholds': dict(monitor.CLASS_SPECIFIC_THRESHOLDS),
+                },
+                workers=VIDEO_SEGMENT_WORKERS,
+                episode_lost_after=EPISODE_LOST_AFTER,
+            )
+        except JobCancelled:
+            for path in (output_path, f"{OUTPUT_DIR}/{thumb_filename}"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            if os.path.exists(input_path):
+                os.remove(input_path)
+        if frame_count:
+            first_frame_thumb = f"/static/{thumb_filename}"
+        return finish_video_analysis(job, output_filename, first_frame_thumb, frame_count, fps, results)
+
+    results = []    # closed episodes
+    # Own tracker & cache so live cameras keep their IDs while the upload is processed
+    context = monitor.get_context(f"video:{job.id}")
+    # Episodes are timed in video seconds, not processing time
+    video_episodes = EpisodeAggregator(lost_after=EPISODE_LOST_AFTER)
+    frame_seconds = 1.0 / fps if fps > 0 else 1.0 / 30
+    frames_processed = 0
+
+    # 2. Pipeline stages
+    def read_frame():
         ret, frame = cap.read()
-        if not ret: break
-        
-        annotated_frame, data = monitor.process_frame(frame, override_requirements=active_requirements)
-        
+        return frame if ret else None
+
+    def process(frame):
+        nonlocal frames_processed
+        # force: offline jobs run even while live monitoring is switched off
+        annotated_frame, data = monitor.process_frame(frame, override_requirements=active_requirements, context=context, force=True)
+        _, closed = video_episodes.update(job.id, data, (start_frame + frames_processed) * frame_seconds)
+        frames_processed += 1
+        results.extend(closed)
+        return annotated_frame
+
+    def write(annotated_frame):
+        nonlocal first_frame_thumb
         # Save first frame as thumbnail
-        if frame_count == 0:
-            thumb_filename = f"thumb_{output_filename}.jpg"
+        if first_frame_thumb is None:
             cv2.imwrite(f"{OUTPUT_DIR}/{thumb_filename}", annotated_frame)
             first_frame_thumb = f"/static/{thumb_filename}"
-
-        if data: results.extend(data)
         out.write(annotated_frame)
-        frame_count += 1
+        job.update_progress(pipeline.frames_written + 1)
 
-    cap.release()
-    out.release()
+    pipeline = VideoPipeline(
+        read_frame, process, write,
+        max_frames=frames_in_range,
+        decode_queue_size=PIPELINE_DECODE_QUEUE,
+        encode_queue_size=PIPELINE_ENCODE_QUEUE,
+        should_stop=lambda: job.cancelled,
+        scope=context.stream_id,
+    )
+
+    # 3. Process Frame by Frame
+    try:
+        frame_count = pipeline.run()
+        job.check_cancelled()
+        for closed in video_episodes.flush().values():
+            results.extend(closed)
+        print(f"[INFO] Job {job.id}: {frame_count} frames, stage timings {pipeline.stats.summary()}")
+    except JobCancelled:
+        # Don't leave half-written videos in the history
+        out.release()
+        for path in (output_path, f"{OUTPUT_DIR}/{thumb_filename}"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        cap.release()
+        out.release()
+        monitor.release_context(context.stream_id)
+        job.stage_latency = stage_metrics.summary(context.stream_id)
+        stage_metrics.forget(context.stream_id)
+        if os.path.exists(input_path):
+            os.remove(input_path)
     
-    # PERSIST RESULTS TO DATABASE
+    job.stage_timings = pipeline.stats.summary()
+    return finish_video_analysis(job, output_filename, first_frame_thumb, frame_count, fps, results)
+
+def finish_video_analysis(job, output_filename: str, first_frame_thumb: str | None, frame_count: int, fps: float, results: list):
+    # PERSIST RESULTS TO DATABASE (offline results wait for queue space instead of being dropped)
     if results:
-        try:
-            with next(get_db()) as db:
-                save_logs(db, results, source=output_filename)
-        except Exception as db_err:
-            print(f"Database Save Error: {db_err}")
-    
-    # Restore monitor state
-    monitor.set_active(was_active)
+        log_writer.enqueue(results, source=output_filename, block=True)
+
+    # Catalog entry for the history page
+    db = SessionLocal()
+    try:
+        db.add(ProcessedVideo(
+            filename=output_filename,
+            original_filename=job.filename,
+            thumbnail_url=first_frame_thumb,
+            created_at=datetime.now(),
+            duration=round(frame_count / fps, 2) if fps > 0 else None,
+            frame_count=frame_count,
+            violations=sum(1 for entry in results if entry.get("missing")),
+            total_detections=len(results),
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Could not catalog {output_filename}: {e}")
+    finally:
+        db.close()
     
     return {
         "status": "Success",
@@ -523,38 +884,179 @@ async def analyze_video(
         "logs": results
     }
 
+def discard_upload(job):
+    """Deletes the upload of a job that was cancelled or dropped before it ran"""
+    input_path = job.params.get('input_path')
+    if input_path and os.path.exists(input_path):
+        os.remove(input_path)
+
+video_jobs = VideoJobQueue(run_video_analysis, max_workers=VIDEO_JOB_WORKERS, on_discard=discard_upload)
+
+from fastapi import Form
+@app.post("/analyze_video")
+async def analyze_video(
+    file: UploadFile = File(...),
+    start_time: float = Form(0.0),
+    end_time: float = Form(None),
+    required_gear: str = Form(None),
+    parallel: bool = Form(False)
+):
+    """Queues the upload for analysis and returns its job id immediately.
+
+    parallel=true splits long recordings into segments processed on several cores.
+    """
+    try:
+        active_requirements = parse_required_gear(required_gear)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    
+    # 1. Save Uploaded File (unique per upload, outside the public static folder)
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    fd, temp_input = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    with os.fdopen(fd, "wb") as buffer:
+        await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+
+    job = video_jobs.submit(
+        file.filename,
+        input_path=temp_input,
+        start_time=start_time,
+        end_time=end_time,
+        active_requirements=active_requirements,
+        parallel=parallel,
+    )
+    return {"status": "Queued", "job_id": job.id, "status_url": f"/api/jobs/{job.id}"}
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": video_jobs.list()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progress of a video job: frames done / total, fps and ETA"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": "Job not found"}
+    return job.progress()
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = video_jobs.cancel(job_id)
+    if job is None:
+        return {"status": "error", "message": "Job not found"}
+    return job.progress()
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": "Job not found"}
+    if job.status != "done":
+        return job.progress()
+    return job.result
+
+HISTORY_SORT_COLUMNS = {
+    "created_at": ProcessedVideo.created_at,
+    "violations": ProcessedVideo.violations,
+    "total_detections": ProcessedVideo.total_detections,
+    "duration": ProcessedVideo.duration,
+    "filename": ProcessedVideo.filename,
+}
+
 @app.get("/api/videos/history")
-async def get_video_history(db: Session = Depends(get_db)):
+async def get_video_history(
+    page: int = 1,
+    page_size: int = 50,
+    sort: str = "created_at",
+    order: str = "desc",
+    db: Session = Depends(get_read_db),
+):
     from sqlalchemy import func
-    # 1. Get all processed files from static folder
-    files = [f for f in os.listdir(OUTPUT_DIR) if f.startswith("processed_") and (f.endswith(".webm") or f.endswith(".mp4"))]
-    files.sort(reverse=True)
-    
-    history = []
-    for filename in files:
-        # 2. Get violation count for this specific file from DB
-        violation_count = db.query(Log).filter(
-            Log.source == filename,
-            func.json_array_length(Log.missing) > 0
-        ).count()
-
-        total_detections = db.query(Log).filter(Log.source == filename).count()
-        
-        # Check if thumbnail exists
-        thumb_name = f"thumb_{filename}.jpg"
-        thumb_path = os.path.join(OUTPUT_DIR, thumb_name)
-        thumb_url = f"/static/{thumb_name}" if os.path.exists(thumb_path) else None
-        
-        history.append({
-            "filename": filename,
-            "url": f"/static/{filename}",
-            "thumbnail_url": thumb_url,
-            "timestamp": os.path.getmtime(os.path.join(OUTPUT_DIR, filename)),
-            "violations": violation_count,
-            "total_detections": total_detections
-        })
-    
-    return {"history": history}
+    if sort not in HISTORY_SORT_COLUMNS:
+        return {"status": "error", "message": f"Unknown sort column '{sort}'"}
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 200)
+
+    column = HISTORY_SORT_COLUMNS[sort]
+    ordering = column.asc() if order == "asc" else column.desc()
+    tiebreak = ProcessedVideo.id.asc() if order == "asc" else ProcessedVideo.id.desc()
+
+    # One query: the page plus the total row count as a window column
+    rows = (
+        db.query(ProcessedVideo, func.count().over().label("total"))
+        .order_by(ordering, tiebreak)
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+        .all()
+    )
+
+    history = [
+        {
+            "filename": video.filename,
+            "original_filename": video.original_filename,
+            "url": f"/static/{video.filename}",
+            "thumbnail_url": video.thumbnail_url,
+            "timestamp": video.created_at.timestamp(),
+            "duration": video.duration,
+            "frame_count": video.frame_count,
+            "violations": video.violations,
+            "total_detections": video.total_detections,
+        }
+        for video, _ in rows
+    ]
+    total = rows[0][1] if rows else db.query(func.count(ProcessedVideo.id)).scalar()
+    return {"history": history, "total": total, "page": page, "page_size": page_size}
+
+# --- METRICS ---
+# Stage latencies/FPS are recorded on the hot paths; the counters and queue depths below
+# already exist on the capture, scheduler, broadcaster and writer objects and are read per scrape
+def live_metric_samples():
+    samples = []
+    for cam_id, cap in list(ACTIVE_CAMERAS.items()):
+        labels = {"scope": cam_id}
+        samples.append(("frames_read_total", "counter", "Frames decoded from the camera", labels, cap.frames_read))
+        samples.append(("frames_dropped_total", "counter", "Frames dropped before use, by where they were dropped",
+                        {**labels, "where": "capture"}, cap.frames_dropped))
+        # Read-only: get_context() would create (and keep) a context for a camera that was just removed
+        context = monitor.contexts.get(cam_id) if monitor else None
+        if context is not None:
+            if context.frame_count:
+                samples.append(("inference_skip_ratio", "gauge", "Fraction of frames that reused cached detections",
+                                labels, 1 - context.inferences_run / context.frame_count))
+            samples.append(("inferences_skipped_static_total", "counter", "Inferences skipped by the motion gate",
+                            labels, context.inferences_skipped_static))
+    for cam_id, broadcaster in list(BROADCASTERS.items()):
+        samples.append(("frames_dropped_total", "counter", "Frames dropped before use, by where they were dropped",
+                        {"scope": cam_id, "where": "viewers"}, broadcaster.frames_skipped_by_clients))
+        samples.append(("stream_subscribers", "gauge", "Clients attached to a camera's broadcaster",
+                        {"scope": cam_id}, broadcaster.stats()["subscribers"]))
+    for cam_id, clients in list(VIDEO_SOCKETS.items()):
+        samples.append(("frames_dropped_total", "counter", "Frames dropped before use, by where they were dropped",
+                        {"scope": cam_id, "where": "websocket"}, sum(c.frames_skipped for c in list(clients))))
+    if scheduler:
+        stats = scheduler.stats()
+        samples.append(("queue_depth", "gauge", "Items waiting in a queue", {"scope": "scheduler", "queue": "inference"}, stats["pending"]))
+        samples.append(("frames_dropped_total", "counter", "Frames dropped before use, by where they were dropped",
+                        {"scope": "scheduler", "where": "batch_queue"}, stats["frames_replaced"]))
+        samples.append(("inference_batch_size", "gauge", "Average frames per model call", {"scope": "scheduler"}, stats["avg_batch_size"]))
+    writer = log_writer.stats()
+    samples.append(("queue_depth", "gauge", "Items waiting in a queue", {"scope": "log_writer", "queue": "logs"}, writer["queued"]))
+    samples.append(("log_rows_total", "counter", "Log rows by outcome", {"outcome": "written"}, writer["written"]))
+    samples.append(("log_rows_total", "counter", "Log rows by outcome", {"outcome": "dropped"}, writer["dropped"]))
+    for status, count in video_jobs.status_counts().items():
+        samples.append(("video_jobs", "gauge", "Video analysis jobs by status", {"status": status}, count))
+    return samples
+
+stage_metrics.add_collector(live_metric_samples)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(stage_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Per-camera / per-job stage latency percentiles, FPS, drops and queue depths"""
+    return stage_metrics.snapshot()
 
 # --- HEALTH CHECK ---
 @app.get("/api/health")
@@ -562,7 +1064,18 @@ async def health_check():
     return {
         "status": "healthy",
         "cameras_active": len(ACTIVE_CAMERAS),
-        "monitor": monitor is not None
+        "monitor": monitor is not None,
+        "models": {
+            "loading": MODEL_LOADING,
+            "loaded": monitor.models_loaded if monitor else False,
+            "warmup_imgsz": MODEL_WARMUP_IMGSZ or None,
+            "registry": model_registry.stats(),
+        },
+        "inference": scheduler.stats() if scheduler else None,
+        "capture": {cam_id: cap.stats() for cam_id, cap in ACTIVE_CAMERAS.items()},
+        "broadcast": {cam_id: b.stats() for cam_id, b in BROADCASTERS.items()},
+        "log_writer": log_writer.stats(),
+        "database": {"profile": DB_PROFILE, "last_checkpoint": list(db_maintenance.last_checkpoint) if db_maintenance.last_checkpoint else None}
     }
 
 # --- PAGE ROUTES (Optional - for standalone backend) ---
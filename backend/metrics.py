@@ -0,0 +1,217 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets in seconds (Prometheus `le`); one more bucket catches the rest
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: O(log buckets) to record, constant memory"""
+
+    __slots__ = ("counts", "sum", "count", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """Estimated from the buckets (linear within a bucket), in seconds"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = min(LATENCY_BUCKETS[i], self.max) if i < len(LATENCY_BUCKETS) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": _ms(self.sum / self.count) if self.count else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "p99_ms": _ms(self.quantile(0.99)),
+            "max_ms": _ms(self.max) if self.count else None,
+        }
+
+
+class RateMeter:
+    """Achieved frames per second (EWMA of the interval between ticks)"""
+
+    __slots__ = ("frames", "last", "interval")
+
+    def __init__(self):
+        self.frames = 0
+        self.last = None
+        self.interval = None
+
+    def tick(self, now):
+        if self.last is not None:
+            dt = now - self.last
+            self.interval = dt if self.interval is None else 0.9 * self.interval + 0.1 * dt
+        self.last = now
+        self.frames += 1
+
+    def fps(self, now, stale_after=5.0):
+        if self.interval is None or now - self.last > stale_after:
+            return 0.0
+        return round(1.0 / self.interval, 1) if self.interval > 0 else 0.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+class StageMetrics:
+    """Per-stage latency histograms and frame rates, keyed by scope (camera id or job).
+
+    Hot paths only call observe()/tick(): a bisect and a few additions under an
+    uncontended per-histogram lock. Counters and queue depths that other objects
+    already keep are pulled at export time from registered collectors, which
+    return (name, kind, help, labels, value) samples.
+    """
+
+    def __init__(self):
+        self._histograms = {}   # (stage, scope) -> Histogram
+        self._rates = {}        # scope -> RateMeter
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage, scope, seconds):
+        key = (stage, scope)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, scope):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, scope, time.perf_counter() - started)
+
+    def tick(self, scope, now=None):
+        """Counts one finished frame for scope's achieved FPS"""
+        rate = self._rates.get(scope)
+        if rate is None:
+            with self._lock:
+                rate = self._rates.setdefault(scope, RateMeter())
+        rate.tick(now if now is not None else time.monotonic())
+
+    def forget(self, scope):
+        """Drops a scope's histograms and rate (camera removed, job finished)"""
+        with self._lock:
+            for key in [k for k in self._histograms if k[1] == scope]:
+                del self._histograms[key]
+            self._rates.pop(scope, None)
+
+    def add_collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+
+    def remove_collector(self, fn):
+        with self._lock:
+            if fn in self._collectors:
+                self._collectors.remove(fn)
+
+    def _samples(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = []
+        for fn in collectors:
+            try:
+                samples.extend(fn())
+            except Exception as e:
+                print(f"[WARNING] Metrics collector failed: {e}")
+        return samples
+
+    def summary(self, scope):
+        """{stage: latency summary} for one scope"""
+        with self._lock:
+            items = [(stage, h) for (stage, s), h in self._histograms.items() if s == scope]
+        return {stage: h.summary() for stage, h in sorted(items)}
+
+    def snapshot(self):
+        """JSON summary: latencies and FPS per scope, plus the collected gauges/counters"""
+        now = time.monotonic()
+        with self._lock:
+            histograms = list(self._histograms.items())
+            rates = list(self._rates.items())
+        scopes = {}
+        for (stage, scope), histogram in sorted(histograms, key=lambda item: (str(item[0][1]), item[0][0])):
+            scopes.setdefault(scope, {"stages": {}})["stages"][stage] = histogram.summary()
+        for scope, rate in rates:
+            entry = scopes.setdefault(scope, {"stages": {}})
+            entry["fps"] = rate.fps(now)
+            entry["frames"] = rate.frames
+        values = {}
+        for name, _, _, labels, value in self._samples():
+            values.setdefault(name, []).append({**labels, "value": value})
+        return {"scopes": scopes, "values": values}
+
+    def prometheus(self, prefix="safety"):
+        """Prometheus text exposition format (version 0.0.4)"""
+        now = time.monotonic()
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+            rates = sorted(self._rates.items(), key=lambda item: str(item[0]))
+
+        lines = [
+            f"# HELP {prefix}_stage_latency_seconds Latency of each processing stage",
+            f"# TYPE {prefix}_stage_latency_seconds histogram",
+        ]
+        bounds = [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+        for (stage, scope), histogram in histograms:
+            with histogram._lock:
+                counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+            base = {"stage": stage, "scope": scope}
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append(f"{prefix}_stage_latency_seconds_bucket{_labels({**base, 'le': bound})} {cumulative}")
+            lines.append(f"{prefix}_stage_latency_seconds_sum{_labels(base)} {total}")
+            lines.append(f"{prefix}_stage_latency_seconds_count{_labels(base)} {count}")
+
+        lines += [f"# HELP {prefix}_fps Achieved frames per second", f"# TYPE {prefix}_fps gauge"]
+        lines += [f"{prefix}_fps{_labels({'scope': scope})} {rate.fps(now)}" for scope, rate in rates]
+
+        grouped = {}
+        for name, kind, help_text, labels, value in self._samples():
+            grouped.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+        for name, (kind, help_text, samples) in grouped.items():
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"]
+            lines += [f"{prefix}_{name}{_labels(labels)} {float(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the live loops, video jobs and the log writer of this process
+stage_metrics = StageMetrics()
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import numpy as np
+
+from inference_backends import load_model
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded models, keyed by weights file and runtime.
+
+    Every SafetyMonitor in the process gets the same model instance for the same
+    (weights, backend, int8) instead of loading its own copy. Load and warm-up
+    timings are recorded for the health endpoint.
+    """
+
+    def __init__(self):
+        self._models = {}       # key -> model
+        self._info = {}         # key -> {"load_seconds", "warmup": {...}}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def _key(weights_path, backend, int8):
+        return (weights_path, backend, bool(int8))
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, weights_path, backend='pytorch', int8=False, self_check=True, sample=None):
+        """Returns the model for weights_path, loading (and exporting) it on first use"""
+        key = self._key(weights_path, backend, int8)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        # One lock per key: a second caller waits for the first load instead of repeating it
+        with self._key_lock(key):
+            model = self._models.get(key)
+            if model is None:
+                started = time.perf_counter()
+                model = load_model(weights_path, backend, int8=int8, self_check=self_check, sample=sample)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._models[key] = model
+                    self._info[key] = {"load_seconds": round(elapsed, 3), "warmup": {}}
+                print(f"[INFO] Loaded {weights_path} ({backend}{', int8' if int8 else ''}) in {elapsed:.2f}s")
+        return model
+
+    def warm_up(self, weights_path, backend, int8, imgsz, **predict_kwargs):
+        """Runs one inference on a blank imgsz x imgsz frame (once per model and size).
+
+        The first call of a model pays for CUDA context / kernel selection, graph
+        compilation and buffer allocation; doing it here keeps that off the first
+        real frame.
+        """
+        key = self._key(weights_path, backend, int8)
+        model = self.get(weights_path, backend, int8)
+        label = str(imgsz)
+        with self._key_lock(key):
+            if label in self._info[key]["warmup"]:
+                return self._info[key]["warmup"][label]
+            blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+            started = time.perf_counter()
+            model.predict(blank, verbose=False, imgsz=imgsz, **predict_kwargs)
+            elapsed = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self._info[key]["warmup"][label] = elapsed
+        print(f"[INFO] Warmed up {weights_path} at {imgsz}px in {elapsed:.2f}s")
+        return elapsed
+
+    def stats(self):
+        with self._lock:
+            return [
+                {"weights": weights, "backend": backend, "int8": int8, **info, "warmup": dict(info["warmup"])}
+                for (weights, backend, int8), info in self._info.items()
+            ]
+
+
+# Shared by every SafetyMonitor in this process
+model_registry = ModelRegistry()
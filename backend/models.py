@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, UniqueConstraint
+from sqlalchemy.orm import declared_attr
 from database import Base
 from datetime import datetime
+from gear_codes import decode_gear
 
 class Log(Base):
     __tablename__ = "logs"
@@ -8,7 +10,61 @@ class Log(Base):
     id = Column(Integer, primary_key=True, index=True)
     person_id = Column(Integer, nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    detected = Column(JSON, nullable=False)  # list of detected equipment names
-    missing = Column(JSON, nullable=False)   # list of missing equipment names
-    source = Column(String, nullable=False)  # e.g., "camera" or video filename
-    confidence = Column(Float, nullable=True)  # optional overall confidence
+    detected_mask = Column(Integer, nullable=False, default=0, index=True)  # bitmask over EQUIPMENT_CLASSES (see gear_codes)
+    missing_mask = Column(Integer, nullable=False, default=0, index=True)   # bitmask of required gear not found
+    is_violation = Column(Boolean, nullable=False, default=False, index=True)
+    source = Column(String, nullable=False, index=True)  # e.g., "camera" or video filename
+    confidence = Column(Float, nullable=True)  # optional overall confidence (peak over the episode)
+    end_timestamp = Column(DateTime, nullable=True)           # last frame of the episode (see episodes.py)
+    frame_count = Column(Integer, nullable=False, default=1, server_default="1")  # frames the episode covers
+
+    @property
+    def detected(self):
+        """List of detected equipment names"""
+        return decode_gear(self.detected_mask)
+
+    @property
+    def missing(self):
+        """List of missing equipment names"""
+        return decode_gear(self.missing_mask)
+
+
+class RollupColumns:
+    """Counts per (bucket, source, gear). gear == '' holds the all-logs row (total, violations);
+    a gear row holds how many logs had that gear detected / missing."""
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False, index=True)   # start of the hour / day
+    source = Column(String, nullable=False)
+    gear = Column(String, nullable=False, default='')
+    total = Column(Integer, nullable=False, default=0)
+    violations = Column(Integer, nullable=False, default=0)
+    detected = Column(Integer, nullable=False, default=0)
+    missing = Column(Integer, nullable=False, default=0)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (UniqueConstraint('bucket', 'source', 'gear', name=f'uq_{cls.__tablename__}_key'),)
+
+
+class HourlyRollup(RollupColumns, Base):
+    __tablename__ = "rollup_hourly"
+
+
+class DailyRollup(RollupColumns, Base):
+    __tablename__ = "rollup_daily"
+
+
+class ProcessedVideo(Base):
+    """Catalog of analyzed uploads (one row per processed_*.webm/mp4 in static/)"""
+    __tablename__ = "processed_videos"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String, nullable=False, unique=True)        # processed_<ts>_<job>.webm
+    original_filename = Column(String, nullable=True)             # name of the uploaded file
+    thumbnail_url = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    duration = Column(Float, nullable=True)                       # seconds of video analyzed
+    frame_count = Column(Integer, nullable=False, default=0)
+    violations = Column(Integer, nullable=False, default=0, index=True)
+    total_detections = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from itertools import islice
+
+
+class RecentEvents:
+    """Fixed-capacity ring buffer of the latest detection entries (newest last).
+
+    Violation / compliant counters are updated as entries are added and evicted,
+    and violations are also kept in their own index, so dashboard polls never
+    rescan the buffer. Safe to add to from several camera threads.
+    """
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self._events = deque()          # (seq, entry)
+        self._violations = deque()      # (seq, entry), subset of _events in the same order
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.violation_count = 0
+        self.total_added = 0
+
+    @staticmethod
+    def _is_violation(entry):
+        return entry.get('status') == 'VIOLATION'
+
+    def add(self, entries):
+        with self._lock:
+            for entry in entries:
+                if len(self._events) >= self.capacity:
+                    seq, evicted = self._events.popleft()
+                    if self._is_violation(evicted):
+                        self.violation_count -= 1
+                        if self._violations and self._violations[0][0] == seq:
+                            self._violations.popleft()
+                self._seq += 1
+                self._events.append((self._seq, entry))
+                if self._is_violation(entry):
+                    self.violation_count += 1
+                    self._violations.append((self._seq, entry))
+                self.total_added += 1
+
+    def latest(self, limit=None):
+        """Newest first; O(limit)"""
+        with self._lock:
+            return [entry for _, entry in islice(reversed(self._events), limit)]
+
+    def latest_violations(self, limit=None):
+        """Newest violations first; O(limit)"""
+        with self._lock:
+            return [entry for _, entry in islice(reversed(self._violations), limit)]
+
+    def counts(self):
+        with self._lock:
+            total = len(self._events)
+            violations = self.violation_count
+        return {
+            "total": total,
+            "violations": violations,
+            "compliant": total - violations,
+            "compliance_rate": round(((total - violations) / total) * 100, 1) if total > 0 else 100,
+        }
+
+    def __len__(self):
+        return len(self._events)
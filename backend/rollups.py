@@ -0,0 +1,197 @@
+"""Hourly / daily analytics rollups, maintained in the same transaction as log inserts.
+
+Rebuild from the raw logs table with:  python rollups.py rebuild
+"""
+import argparse
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+
+from gear_codes import GEAR_BITS, decode_gear
+from models import Log, HourlyRollup, DailyRollup
+
+HOUR = timedelta(hours=1)
+COUNT_COLUMNS = ("total", "violations", "detected", "missing")
+
+# Rollup model -> strftime format of its bucket (same text layout SQLAlchemy stores DateTime in)
+BUCKET_FORMATS = {
+    HourlyRollup: "%Y-%m-%d %H:00:00.000000",
+    DailyRollup: "%Y-%m-%d 00:00:00.000000",
+}
+
+
+def _floor_hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket(ts, model):
+    if model is HourlyRollup:
+        return _floor_hour(ts)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# --- MAINTENANCE ---
+def rollup_increments(rows):
+    """Log row mappings (log_service.log_row) -> {(model, bucket, source, gear): [total, violations, detected, missing]}"""
+    increments = defaultdict(lambda: [0, 0, 0, 0])
+    for row in rows:
+        for model in BUCKET_FORMATS:
+            key = (model, _bucket(row["timestamp"], model), row["source"])
+            counts = increments[key + ('',)]
+            counts[0] += 1
+            counts[1] += int(bool(row["is_violation"]))
+            for gear in decode_gear(row["detected_mask"]):
+                increments[key + (gear,)][2] += 1
+            for gear in decode_gear(row["missing_mask"]):
+                increments[key + (gear,)][3] += 1
+    return increments
+
+
+def apply_rollups(db, rows):
+    """Adds freshly inserted log rows to the rollups. Call before the insert's commit."""
+    increments = rollup_increments(rows)
+    for model in BUCKET_FORMATS:
+        values = [
+            dict(bucket=bucket, source=source, gear=gear, **dict(zip(COUNT_COLUMNS, counts)))
+            for (m, bucket, source, gear), counts in increments.items() if m is model
+        ]
+        if not values:
+            continue
+        stmt = insert(model.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bucket", "source", "gear"],
+            set_={col: model.__table__.c[col] + stmt.excluded[col] for col in COUNT_COLUMNS},
+        )
+        db.execute(stmt, values)
+
+
+def rebuild_rollups(engine):
+    """Regenerates both rollup tables from the logs table in one transaction"""
+    with engine.begin() as conn:
+        for model, fmt in BUCKET_FORMATS.items():
+            table = model.__tablename__
+            bucket = f"strftime('{fmt}', timestamp)"
+            conn.execute(text(f"DELETE FROM {table}"))
+            conn.execute(text(f"""
+                INSERT INTO {table} (bucket, source, gear, total, violations, detected, missing)
+                SELECT {bucket}, source, '', COUNT(*), SUM(is_violation), 0, 0
+                FROM logs GROUP BY 1, source
+            """))
+            for gear, bit in GEAR_BITS.items():
+                conn.execute(text(f"""
+                    INSERT INTO {table} (bucket, source, gear, total, violations, detected, missing)
+                    SELECT {bucket}, source, :gear, 0, 0,
+                           SUM((detected_mask & {bit}) != 0), SUM((missing_mask & {bit}) != 0)
+                    FROM logs WHERE ((detected_mask | missing_mask) & {bit}) != 0 GROUP BY 1, source
+                """), {"gear": gear})
+        rows = conn.execute(text("SELECT COUNT(*) FROM logs")).scalar()
+    print(f"[INFO] Rebuilt analytics rollups from {rows} detection logs")
+
+
+# --- QUERIES ---
+class _Summary:
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, 0])     # date -> [total, violations]
+        self.sources = defaultdict(int)             # source -> violations
+        self.detected = defaultdict(int)
+        self.missing = defaultdict(int)
+
+    def add_rollups(self, db, model, source, lo=None, hi=None):
+        """Buckets with lo <= bucket < hi"""
+        filters = []
+        if lo is not None:
+            filters.append(model.bucket >= lo)
+        if hi is not None:
+            filters.append(model.bucket < hi)
+        if source is not None:
+            filters.append(model.source == source)
+
+        day = func.date(model.bucket)
+        for d, total, violations in db.query(day, func.sum(model.total), func.sum(model.violations)) \
+                .filter(model.gear == '', *filters).group_by(day):
+            self.days[d][0] += total
+            self.days[d][1] += violations
+        for src, violations in db.query(model.source, func.sum(model.violations)) \
+                .filter(model.gear == '', *filters).group_by(model.source):
+            self.sources[src] += violations
+        for gear, detected, missing in db.query(model.gear, func.sum(model.detected), func.sum(model.missing)) \
+                .filter(model.gear != '', *filters).group_by(model.gear):
+            self.detected[gear] += detected
+            self.missing[gear] += missing
+
+    def add_logs(self, db, source, lo, hi, hi_inclusive):
+        """Raw logs with lo <= timestamp < hi (or <= hi), for partial hours at the range edges"""
+        day = func.date(Log.timestamp)
+        query = db.query(day, Log.source, Log.detected_mask, Log.missing_mask, Log.is_violation, func.count()) \
+            .filter(Log.timestamp >= lo, Log.timestamp <= hi if hi_inclusive else Log.timestamp < hi)
+        if source is not None:
+            query = query.filter(Log.source == source)
+        for d, src, detected_mask, missing_mask, is_violation, n in \
+                query.group_by(day, Log.source, Log.detected_mask, Log.missing_mask, Log.is_violation):
+            self.days[d][0] += n
+            if is_violation:
+                self.days[d][1] += n
+                self.sources[src] += n
+            for gear in decode_gear(detected_mask):
+                self.detected[gear] += n
+            for gear in decode_gear(missing_mask):
+                self.missing[gear] += n
+
+    def result(self):
+        days = sorted(self.days.items())
+        return {
+            "detected": {gear: n for gear, n in sorted(self.detected.items()) if n},
+            "missing": {gear: n for gear, n in sorted(self.missing.items()) if n},
+            "violationTrend": [{"date": d, "violations": v} for d, (t, v) in days if v],
+            "complianceTrend": [
+                {"date": d, "score": round(((t - v) / t) * 100, 1) if t > 0 else 100}
+                for d, (t, v) in days if t
+            ],
+            "cameraPerformance": [{"camera": s, "violations": v} for s, v in sorted(self.sources.items()) if v],
+        }
+
+
+def summarize(db, start=None, end=None, source=None):
+    """Analytics summary for start <= timestamp <= end (both optional) and one source (optional).
+
+    Whole hours come from the rollups; only the partial hours at the edges of the
+    range are counted from the logs table, so the result equals a raw-table query.
+    """
+    summary = _Summary()
+    if start is None and end is None:
+        summary.add_rollups(db, DailyRollup, source)
+        return summary.result()
+
+    # Hour buckets fully inside [start, end]: first_full <= bucket < last_full
+    first_full = None
+    if start is not None:
+        first_full = _floor_hour(start)
+        if first_full < start:
+            first_full += HOUR
+    last_full = _floor_hour(end) if end is not None else None
+
+    if first_full is not None and last_full is not None and first_full >= last_full:
+        summary.add_logs(db, source, start, end, hi_inclusive=True)
+        return summary.result()
+
+    summary.add_rollups(db, HourlyRollup, source, first_full, last_full)
+    if start is not None and start < first_full:
+        summary.add_logs(db, source, start, first_full, hi_inclusive=False)
+    if end is not None:
+        summary.add_logs(db, source, last_full, end, hi_inclusive=True)
+    return summary.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analytics rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: regenerate rollups from the logs table")
+    args = parser.parse_args()
+
+    from database import engine, Base, init_database
+    from db_migrations import migrate_log_bitmasks
+    init_database()
+    Base.metadata.create_all(bind=engine)
+    migrate_log_bitmasks(engine)
+    rebuild_rollups(engine)
@@ -1,32 +1,268 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from datetime import datetime
 import torch
 import os
+import inspect
+import yaml
+from ultralytics.trackers.basetrack import BaseTrack
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from model_registry import model_registry
+from metrics import stage_metrics
+from gear_codes import EQUIPMENT_CLASSES, normalize_gear_names
+from inference_region import InferenceRegion
+import threading
+import math
+import time
+from collections import OrderedDict
+
+# ByteTrack settings shipped with the backend
+TRACKER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bytetrack.yaml")
+
+
+def new_tracker(config_path=TRACKER_CONFIG, frame_rate=30):
+    """A ByteTrack instance, built the same way on every supported ultralytics version.
+
+    BYTETracker takes frame_rate only before 8.4. Before 8.4 its constructor also
+    resets the track ID counter that every tracker in the process shares; the
+    counter is put back so creating a tracker never renumbers the other streams.
+    """
+    with open(config_path) as f:
+        cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+    kwargs = {'frame_rate': frame_rate} if 'frame_rate' in inspect.signature(BYTETracker.__init__).parameters else {}
+    count = BaseTrack._count
+    tracker = BYTETracker(args=cfg, **kwargs)
+    BaseTrack._count = count
+    return tracker
+
+
+class StreamContext:
+    """Per-stream state (one per camera id or video job).
+
+    Holds the stream's own ByteTrack instance, skip counter and detection cache,
+    while the models themselves stay shared on the SafetyMonitor.
+    """
+    def __init__(self, stream_id, skip_frames=2):
+        self.stream_id = stream_id
+        self.SKIP_FRAMES = skip_frames
+        self.frame_count = 0
+        self.tracker = None
+        # Person IDs are numbered per stream: tracker ID -> this stream's ID. The numbering
+        # carries on when the tracker is re-created, so an ID is never reused within a stream
+        self._track_ids = OrderedDict()
+        self._next_track_id = 1
+
+        # Cache for re-evaluation (allows instant settings updates)
+        self.last_pose_data = None
+        self.last_equip_data = []
+
+        # Motion gate (off by default): skip inference while the scene is static
+        self.motion_gate = False
+        self.motion_pixel_threshold = 25     # grey-level change for a pixel to count as "moved"
+        self.motion_area_threshold = 0.01    # fraction of moved pixels that counts as motion
+        self.motion_max_static_frames = 150  # force a refresh after this many gated frames
+        self.motion_size = (160, 90)         # downscaled comparison size
+        self._motion_reference = None        # small grey frame from the last inference
+        self._static_streak = 0
+
+        # Adaptive skipping: SKIP_FRAMES follows the measured inference latency
+        self.adaptive_skip = False
+        self.target_fps = 15.0
+        self.min_skip = 0
+        self.max_skip = 10
+        self.inference_ms = None             # EWMA of pose + PPE latency seen by this stream
+
+        # ROI crop / inference resolution (None: full frame at the models' default size)
+        self.region = None
+
+        # Counters
+        self.inferences_run = 0
+        self.inferences_skipped_static = 0
+
+    def configure_motion_gate(self, enabled, pixel_threshold=None, area_threshold=None, max_static_frames=None):
+        self.motion_gate = enabled
+        if pixel_threshold is not None:
+            self.motion_pixel_threshold = pixel_threshold
+        if area_threshold is not None:
+            self.motion_area_threshold = area_threshold
+        if max_static_frames is not None:
+            self.motion_max_static_frames = max_static_frames
+        self._motion_reference = None
+        self._static_streak = 0
+
+    def configure_skip(self, adaptive, skip_frames=None, target_fps=None):
+        self.adaptive_skip = adaptive
+        if skip_frames is not None:
+            self.SKIP_FRAMES = skip_frames
+        if target_fps is not None:
+            self.target_fps = target_fps
+
+    def configure_region(self, rois=None, inference_size=None):
+        """Restricts inference to ROIs and/or a smaller input size (None/[] for the full frame)"""
+        self.region = InferenceRegion(rois, inference_size) if rois or inference_size else None
+        # Tracks live in model-input coordinates, which just changed
+        self.tracker = None
+        self.last_pose_data = None
+        self.last_equip_data = []
+
+    def use_tracker(self, tracker):
+        """Installs a new tracker; its track IDs may start over, the stream's person IDs don't"""
+        self.tracker = tracker
+        self._track_ids.clear()
+
+    def stream_track_ids(self, tracker_ids, keep=4096):
+        """Maps the current tracker's track IDs to this stream's person IDs"""
+        ids = []
+        for tracker_id in tracker_ids:
+            tracker_id = int(tracker_id)
+            stream_id = self._track_ids.get(tracker_id)
+            if stream_id is None:
+                stream_id = self._track_ids[tracker_id] = self._next_track_id
+                self._next_track_id += 1
+                # Tracks this old have long been dropped by the tracker (track_buffer)
+                while len(self._track_ids) > keep:
+                    self._track_ids.popitem(last=False)
+            ids.append(stream_id)
+        return np.asarray(ids, dtype=np.float32)
+
+    def inference_input(self, frame):
+        """-> (image for the models, scale, offset) for this stream's region"""
+        if self.region is None:
+            return frame, 1.0, (0, 0)
+        return self.region.prepare(frame)
+
+    @property
+    def inference_size(self):
+        return self.region.inference_size if self.region is not None else None
+
+    def record_inference(self, seconds):
+        """Feeds one measured inference latency (incl. time queued for a batch) into the EWMA"""
+        ms = seconds * 1000.0
+        self.inference_ms = ms if self.inference_ms is None else 0.8 * self.inference_ms + 0.2 * ms
+        if self.adaptive_skip:
+            self._adapt_skip()
+
+    def _adapt_skip(self):
+        # One inference every (SKIP_FRAMES + 1) frames must fit into that many frame slots at target_fps.
+        # Batch queueing is part of the latency, so streams back off automatically when many cameras are active.
+        needed = int(math.ceil(self.inference_ms * self.target_fps / 1000.0)) - 1
+        needed = max(self.min_skip, min(self.max_skip, needed))
+        # Move one step at a time so the interval doesn't oscillate
+        if needed > self.SKIP_FRAMES:
+            self.SKIP_FRAMES += 1
+        elif needed < self.SKIP_FRAMES:
+            self.SKIP_FRAMES -= 1
+
+    def _small_grey(self, frame):
+        small = cv2.resize(frame, self.motion_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def has_motion(self, frame):
+        """Cheap frame-difference check against the frame of the last inference"""
+        small = self._small_grey(frame)
+        reference = self._motion_reference
+        if reference is None or self._static_streak >= self.motion_max_static_frames:
+            self._motion_reference = small
+            self._static_streak = 0
+            return True
+
+        changed = np.count_nonzero(cv2.absdiff(small, reference) > self.motion_pixel_threshold)
+        if changed >= self.motion_area_threshold * small.size:
+            self._motion_reference = small
+            self._static_streak = 0
+            return True
+
+        self._static_streak += 1
+        return False
+
+    def next_frame(self, frame=None):
+        """Advances the skip counter. Returns True if this frame needs fresh inference.
+
+        With the motion gate on, a scheduled inference is skipped (and the cached
+        detections reused) when the frame hasn't changed since the last inference.
+        """
+        self.frame_count += 1
+        if not (self.frame_count == 1 or self.frame_count % (self.SKIP_FRAMES + 1) == 0):
+            return False
+        if self.motion_gate and frame is not None and not self.has_motion(frame):
+            self.inferences_skipped_static += 1
+            return False
+        self.inferences_run += 1
+        return True
+
+    def reset(self):
+        self.frame_count = 0
+        self.tracker = None
+        self.last_pose_data = None
+        self.last_equip_data = []
+        self._motion_reference = None
+        self._static_streak = 0
+
+    def stats(self):
+        return {
+            "frames": self.frame_count,
+            "skip_frames": self.SKIP_FRAMES,
+            "adaptive_skip": self.adaptive_skip,
+            "target_fps": self.target_fps,
+            "inference_ms": round(self.inference_ms, 1) if self.inference_ms is not None else None,
+            "inferences_run": self.inferences_run,
+            "inferences_skipped_static": self.inferences_skipped_static,
+            "region": self.region.describe() if self.region is not None else None,
+            "motion_gate": {
+                "enabled": self.motion_gate,
+                "pixel_threshold": self.motion_pixel_threshold,
+                "area_threshold": self.motion_area_threshold,
+                "max_static_frames": self.motion_max_static_frames,
+            },
+        }
+
+
+# Ways to run the PPE model: on the full frame, on per-person crops, or on one union ROI
+PPE_MODES = ('full', 'crops', 'roi')
+
 
 class SafetyMonitor:
-    def __init__(self, pose_model_path='yolov8n-pose.pt', obj_model_path=r'C:\Users\Pragyan\Downloads\safety-compliance-dashboard\backend\bests-150epoch-pro.pt'):
+    def __init__(self, pose_model_path='yolov8n-pose.pt', obj_model_path=r'C:\Users\Pragyan\Downloads\safety-compliance-dashboard\backend\bests-150epoch-pro.pt',
+                 backend='pytorch', int8=False, self_check=True, ppe_mode='full', lazy=False, warmup_imgsz=640,
+                 self_check_sample=None):
         # Check for GPU
         self.device = '0' if torch.cuda.is_available() else 'cpu'
-        print(f"🚀 Loading models on {self.device}...")
-
-        # Load Pose Model (downloads automatically if not present)
-        self.pose_model = YOLO(pose_model_path)
-        
-        # Load Object Detection Model (with graceful fallback)
-        self.obj_model = None
-        self.demo_mode = False
-        
-        if os.path.exists(obj_model_path):
-            print(f"✓ Loading custom PPE model: {obj_model_path}")
-            self.obj_model = YOLO(obj_model_path)
-        else:
+        # Runtime: 'pytorch' (.pt), or CPU-optimized 'onnx' / 'openvino' exports (optionally INT8)
+        self.backend = backend
+        self.int8 = int8
+        # FP16 only helps PyTorch on CUDA; on CPU and exported runtimes it is a no-op at best
+        self.half = self.device != 'cpu' and backend == 'pytorch'
+        self.self_check = self_check
+        self.self_check_sample = self_check_sample   # image the export self-check runs on (None: bus.jpg)
+
+        # Models come from the process-wide registry (each weights file is loaded once per
+        # process); with lazy=True they are loaded on first use instead of here
+        self.pose_model_path = pose_model_path
+        self.obj_model_path = obj_model_path
+        self.warmup_imgsz = warmup_imgsz   # warm-up inference size (None: no warm-up)
+        self._pose_model = None
+        self._obj_model = None
+        self._models_lock = threading.Lock()
+        self.models_loaded = False
+
+        # Object Detection Model is optional (graceful fallback)
+        self.demo_mode = not os.path.exists(obj_model_path)
+        if self.demo_mode:
             print(f"⚠️ WARNING: Custom model '{obj_model_path}' not found!")
             print("   Running in DEMO MODE (pose detection only)")
             print(f"   To enable PPE detection, place your model file at: {os.path.abspath(obj_model_path)}")
-            self.demo_mode = True
-        
+
+        # PPE stage: 'full' frame, per-person 'crops', or one union 'roi' per frame
+        if ppe_mode not in PPE_MODES:
+            raise ValueError(f"Unknown PPE mode '{ppe_mode}'. Choose from: {', '.join(PPE_MODES)}")
+        self.ppe_mode = ppe_mode
+        self.ppe_crop_padding = 0.15   # crop margin, as a fraction of the person box
+        self.ppe_crop_imgsz = 320      # crops are small, no need to upscale them to 640
+        self.ppe_frames_skipped = 0    # frames where nobody was detected
+
         # --- STATE & SETTINGS ---
         self.is_active = False  # Default: Monitoring OFF
         self.general_conf = 0.63
@@ -40,24 +276,110 @@ class SafetyMonitor:
             'Mask': 0.30
         }
 
-        self.EQUIPMENT_CLASSES = {
-            0: 'Coverall', 
-            1: 'Face_Shield', 
-            2: 'Gloves', 
-            3: 'Goggles', 
-            4: 'Mask'
-        }
+        self.EQUIPMENT_CLASSES = dict(EQUIPMENT_CLASSES)
         
         # Default: All gear is required
         self.REQUIRED_GEAR = {'mask', 'gloves', 'coverall', 'goggles', 'face_shield'}
 
-        # Optimization vars
-        self.frame_count = 0
+        # Canonical gear names (order matters: first substring match wins when normalizing)
+        self.GEAR_NAMES = ['mask', 'gloves', 'coverall', 'goggles', 'face_shield']
+        self._gear_name_cache = {}
+
+        # Keypoints that must fall inside a gear box for it to belong to a person
+        self.GEAR_KEYPOINTS = {
+            'mask': [0, 3, 4],           # Nose, ears
+            'goggles': [1, 2],           # Eyes
+            'face_shield': [0, 1, 2],    # Nose, eyes
+            'gloves': [9, 10],           # Wrists
+            'coverall': [5, 6, 11, 12]   # Shoulders, hips
+        }
+        # Same table as a (gear x keypoint) boolean mask for the vectorized check
+        n_kps = max(max(v) for v in self.GEAR_KEYPOINTS.values()) + 1
+        self.GEAR_KP_MASK = np.zeros((len(self.GEAR_NAMES), n_kps), dtype=bool)
+        for g, name in enumerate(self.GEAR_NAMES):
+            self.GEAR_KP_MASK[g, self.GEAR_KEYPOINTS[name]] = True
+
+        # Optimization vars (default for new streams)
         self.SKIP_FRAMES = 2
-        
-        # Cache for re-evaluation (allows instant settings updates)
-        self.last_pose_data = None
-        self.last_equip_data = []
+        self.adaptive_skip = False
+        self.target_fps = 15.0
+
+        # Per-stream tracker / skip counter / cache, keyed by camera id or job id
+        self.tracker_config = TRACKER_CONFIG
+        self.contexts = {}
+        self._contexts_lock = threading.Lock()
+
+        # ultralytics predictors aren't thread-safe; live batches and video jobs take turns
+        self._model_lock = threading.Lock()
+
+        if not lazy:
+            self.load_models()
+
+    def load_models(self):
+        """Fetches both models from the registry and warms them up (no-op once loaded)"""
+        with self._models_lock:
+            if self.models_loaded:
+                return
+            print(f"🚀 Loading models on {self.device} ({self.backend}{', int8' if self.int8 else ''})...")
+            # Pose model downloads automatically if not present
+            self._pose_model = model_registry.get(self.pose_model_path, self.backend, self.int8, self.self_check,
+                                                  self.self_check_sample)
+            if not self.demo_mode:
+                print(f"✓ Loading custom PPE model: {self.obj_model_path}")
+                self._obj_model = model_registry.get(self.obj_model_path, self.backend, self.int8, self.self_check,
+                                                     self.self_check_sample)
+
+            if self.warmup_imgsz:
+                predict_kwargs = dict(device=self.device, half=self.half)
+                model_registry.warm_up(self.pose_model_path, self.backend, self.int8, self.warmup_imgsz, **predict_kwargs)
+                if not self.demo_mode:
+                    ppe_imgsz = self.warmup_imgsz if self.ppe_mode == 'full' else self.ppe_crop_imgsz
+                    model_registry.warm_up(self.obj_model_path, self.backend, self.int8, ppe_imgsz, **predict_kwargs)
+            self.models_loaded = True
+
+    @property
+    def pose_model(self):
+        if not self.models_loaded:
+            self.load_models()
+        return self._pose_model
+
+    @property
+    def obj_model(self):
+        if not self.models_loaded:
+            self.load_models()
+        return self._obj_model
+
+    def get_context(self, stream_id):
+        """Returns the StreamContext for stream_id, creating it on first use"""
+        with self._contexts_lock:
+            context = self.contexts.get(stream_id)
+            if context is None:
+                context = StreamContext(stream_id, skip_frames=self.SKIP_FRAMES)
+                context.configure_skip(self.adaptive_skip, target_fps=self.target_fps)
+                self.contexts[stream_id] = context
+            return context
+
+    def find_context(self, stream_id):
+        """The stream's StreamContext, or None if it has none (never creates one)"""
+        with self._contexts_lock:
+            return self.contexts.get(stream_id)
+
+    def release_context(self, stream_id):
+        with self._contexts_lock:
+            self.contexts.pop(stream_id, None)
+
+    def set_skip_mode(self, adaptive: bool, skip_frames=None, target_fps=None):
+        """Fixed or adaptive frame skipping, applied to new and existing streams"""
+        self.adaptive_skip = adaptive
+        if skip_frames is not None:
+            self.SKIP_FRAMES = skip_frames
+        if target_fps is not None:
+            self.target_fps = target_fps
+        with self._contexts_lock:
+            for context in self.contexts.values():
+                # Fixed mode puts every stream back on the global interval, not the one it adapted to
+                context.configure_skip(adaptive, skip_frames if adaptive else self.SKIP_FRAMES, target_fps)
+        print(f"[INFO] Frame skipping: {'adaptive @ ' + str(self.target_fps) + ' fps' if adaptive else self.SKIP_FRAMES}")
 
     def set_active(self, status: bool):
         self.is_active = status
@@ -68,8 +390,8 @@ class SafetyMonitor:
         self.general_conf = val
 
     def update_requirements(self, active_gear: list):
-        """Update what gear is considered mandatory"""
-        self.REQUIRED_GEAR = set(active_gear)
+        """Update what gear is considered mandatory (ValueError for unknown names)"""
+        self.REQUIRED_GEAR = set(normalize_gear_names(active_gear))
         print(f"[INFO] Updated Compliance Rules: {self.REQUIRED_GEAR}")
 
     def is_overlapping(self, box1, box2):
@@ -81,12 +403,7 @@ class SafetyMonitor:
 
     def check_keypoint_association(self, equip_box, keypoints, equip_type):
         x1, y1, x2, y2 = equip_box
-        relevant_kps = []
-        if 'mask' in equip_type: relevant_kps = [0, 3, 4] # Nose, ears
-        elif 'goggles' in equip_type: relevant_kps = [1, 2] # Eyes
-        elif 'face_shield' in equip_type: relevant_kps = [0, 1, 2] # Nose, eyes
-        elif 'gloves' in equip_type: relevant_kps = [9, 10] # Wrists
-        elif 'coverall' in equip_type: relevant_kps = [5, 6, 11, 12] # Shoulders, hips
+        relevant_kps = next((kps for gear, kps in self.GEAR_KEYPOINTS.items() if gear in equip_type), [])
 
         for kp_idx in relevant_kps:
             if kp_idx < len(keypoints):
@@ -95,72 +412,293 @@ class SafetyMonitor:
                     return True
         return False
 
-    def process_frame(self, frame, override_requirements=None):
-        # 1. IDLE STATE
-        if not self.is_active:
+    def normalize_gear(self, class_name):
+        """Maps a model class name (e.g. 'Face_Shield') to its gear id ('face_shield') or None"""
+        if class_name not in self._gear_name_cache:
+            lowered = class_name.lower()
+            self._gear_name_cache[class_name] = next((k for k in self.GEAR_NAMES if k in lowered), None)
+        return self._gear_name_cache[class_name]
+
+    def associate_equipment(self, person_boxes, person_kps, equip_boxes, equip_gear):
+        """Vectorized is_overlapping + check_keypoint_association.
+
+        Returns a (persons x equipment) boolean matrix that is True where the
+        equipment box overlaps the person box and contains at least one of the
+        keypoints relevant to that gear type.
+        """
+        # Box overlap (strict, same as is_overlapping)
+        pb = person_boxes[:, None, :]
+        eb = equip_boxes[None, :, :]
+        overlap = (
+            (np.minimum(pb[..., 2], eb[..., 2]) > np.maximum(pb[..., 0], eb[..., 0])) &
+            (np.minimum(pb[..., 3], eb[..., 3]) > np.maximum(pb[..., 1], eb[..., 1]))
+        )
+
+        # Keypoint inside equipment box: persons x equipment x keypoints
+        kx = person_kps[:, None, :, 0]
+        ky = person_kps[:, None, :, 1]
+        inside = (
+            (equip_boxes[None, :, 0, None] < kx) & (kx < equip_boxes[None, :, 2, None]) &
+            (equip_boxes[None, :, 1, None] < ky) & (ky < equip_boxes[None, :, 3, None])
+        )
+
+        # Only the keypoints relevant to each equipment's gear type (and that the person has)
+        n_kps = person_kps.shape[1]
+        relevant = np.zeros((len(equip_gear), n_kps), dtype=bool)
+        width = min(n_kps, self.GEAR_KP_MASK.shape[1])
+        relevant[:, :width] = self.GEAR_KP_MASK[equip_gear, :width]
+
+        return overlap & (inside & relevant[None, :, :]).any(axis=2)
+
+    def process_frame(self, frame, override_requirements=None, context=None, force=False):
+        # 1. IDLE STATE (offline jobs pass force=True to run regardless)
+        if not self.is_active and not force:
             return frame, []
 
-        self.frame_count += 1
+        # Callers without their own stream share a default context
+        if context is None:
+            context = self.get_context("default")
+
         annotated_frame = frame.copy()
 
         # Decide if we run fresh inference or use cached data
-        run_inference = True
-        if self.frame_count > 1 and self.frame_count % (self.SKIP_FRAMES + 1) != 0:
-            run_inference = False
-
-        if run_inference:
-            # 2. Run Pose Tracking (ByteTrack Applied Here)
-            # CHANGE: tracker="bytetrack.yaml" now looks for your LOCAL file first
-            pose_results = self.pose_model.track(
-                frame, 
-                persist=True, 
-                verbose=False, 
-                tracker="bytetrack.yaml", 
-                device=self.device, 
-                half=True
-            )
-            
-            # 3. Run Object Detection (GPU - Low Confidence Pass)
-            # Only run if model is available (not in demo mode)
-            self.last_equip_data = []
-            if self.obj_model is not None:
-                obj_results = self.obj_model(frame, verbose=False, device=self.device, half=True, conf=0.10)
-
-                # 4. Store Raw Equipment Data
-                if obj_results[0].boxes:
-                    boxes = obj_results[0].boxes
-                    cls = boxes.cls.cpu().numpy()
-                    conf = boxes.conf.cpu().numpy()
-                    xyxy = boxes.xyxy.cpu().numpy()
-                
-                    for i, c in enumerate(cls):
-                        cls_name = self.EQUIPMENT_CLASSES.get(int(c), 'unknown')
-                        score = float(conf[i])
-                        
-                        # Sensitivity Logic
-                        specific_thresh = self.CLASS_SPECIFIC_THRESHOLDS.get(cls_name)
-                        required_score = specific_thresh if specific_thresh is not None else self.general_conf
-                        
-                        if score >= required_score:
-                            self.last_equip_data.append({'bbox': xyxy[i], 'class': cls_name})
-
-            # 5. Store Raw Pose Data
-            self.last_pose_data = None
-            if pose_results[0].boxes and pose_results[0].keypoints:
-                boxes = pose_results[0].boxes
-                keypoints = pose_results[0].keypoints
-                
-                self.last_pose_data = {
-                    'ids': boxes.id.cpu().numpy() if boxes.id is not None else [0] * len(boxes),
-                    'bboxes': boxes.xyxy.cpu().numpy(),
-                    'kps': keypoints.xy.cpu().numpy()
-                }
+        if context.next_frame(frame):
+            # 2-4. Pose tracking (per-stream ByteTrack) + PPE detection
+            started = time.perf_counter()
+            self.infer_batch([frame], [context])
+            context.record_inference(time.perf_counter() - started)
 
         # --- ALWAYS RUN COMPLIANCE CHECK (Even on skipped frames) ---
-        visuals, persons_data = self.compute_compliance(self.last_pose_data, self.last_equip_data, override_requirements)
-        
-        annotated_frame = self.draw_visuals(annotated_frame, visuals)
-        return annotated_frame, persons_data
+        return self.annotate(annotated_frame, context.last_pose_data, context.last_equip_data, override_requirements,
+                             scope=context.stream_id)
+
+    def annotate(self, frame, pose_data, equip_data, override_requirements=None, scope="default"):
+        """Runs the compliance check on cached detections and draws it onto frame (in place)"""
+        with stage_metrics.timer("compute_compliance", scope):
+            visuals, persons_data = self.compute_compliance(pose_data, equip_data, override_requirements)
+        with stage_metrics.timer("draw_visuals", scope):
+            frame = self.draw_visuals(frame, visuals)
+        return frame, persons_data
+
+    def extract_equipment(self, obj_result, offset=(0, 0), scale=1.0):
+        """Applies per-class sensitivity to a raw PPE result -> [{'bbox', 'class', 'gear', 'conf'}]
+
+        `offset` is the (x, y) origin of the crop the result came from and `scale`
+        the factor it was resized by, so boxes always end up in full-frame coordinates.
+        """
+        equip_data = []
+        if obj_result.boxes:
+            boxes = obj_result.boxes
+            cls = boxes.cls.cpu().numpy()
+            conf = boxes.conf.cpu().numpy()
+            xyxy = boxes.xyxy.cpu().numpy()
+            xyxy = InferenceRegion.map_boxes(xyxy, scale, offset)
+
+            for i, c in enumerate(cls):
+                cls_name = self.EQUIPMENT_CLASSES.get(int(c), 'unknown')
+                score = float(conf[i])
+
+                # Sensitivity Logic
+                specific_thresh = self.CLASS_SPECIFIC_THRESHOLDS.get(cls_name)
+                required_score = specific_thresh if specific_thresh is not None else self.general_conf
+
+                if score >= required_score:
+                    equip_data.append({'bbox': xyxy[i], 'class': cls_name, 'gear': self.normalize_gear(cls_name), 'conf': score})
+        return equip_data
+
+    def extract_pose(self, pose_result, tracks=None):
+        """Converts a pose result into the cached pose dict (ids, bboxes, scores, kps).
+
+        If ByteTrack output is given, boxes/ids come from the tracks and keypoints
+        are re-indexed to match them.
+        """
+        if not pose_result.boxes or not pose_result.keypoints:
+            return None
+
+        if tracks is not None:
+            if len(tracks) == 0:
+                return None
+            idx = tracks[:, -1].astype(int)
+            return {
+                'ids': tracks[:, 4],
+                'bboxes': tracks[:, :4],
+                'scores': tracks[:, 5],
+                'kps': pose_result.keypoints.xy.cpu().numpy()[idx]
+            }
+
+        boxes = pose_result.boxes
+        return {
+            'ids': boxes.id.cpu().numpy() if boxes.id is not None else [0] * len(boxes),
+            'bboxes': boxes.xyxy.cpu().numpy(),
+            'scores': boxes.conf.cpu().numpy(),
+            'kps': pose_result.keypoints.xy.cpu().numpy()
+        }
+
+    @staticmethod
+    def map_pose(pose_data, scale, offset):
+        """Maps a pose dict from model-input to frame coordinates"""
+        if pose_data is None or (scale == 1.0 and offset == (0, 0)):
+            return pose_data
+        return dict(pose_data,
+                    bboxes=InferenceRegion.map_boxes(pose_data['bboxes'], scale, offset),
+                    kps=InferenceRegion.map_points(pose_data['kps'], scale, offset))
+
+    @staticmethod
+    def size_groups(indices, sizes):
+        """Groups batch indices by inference size (one model call per distinct imgsz)"""
+        groups = {}
+        for i in indices:
+            groups.setdefault(sizes[i], []).append(i)
+        return groups.items()
+
+    def update_tracker(self, context, pose_result):
+        """Feeds one stream's pose detections into that stream's own ByteTrack instance.
+
+        ultralytics' .track(persist=True) keeps a single tracker per model, which
+        mixes IDs across cameras and jobs, so tracking is done per context here.
+        Track IDs are replaced by the context's own person IDs.
+        """
+        if context.tracker is None:
+            context.use_tracker(new_tracker(self.tracker_config))
+        det = pose_result.boxes.cpu().numpy()
+        tracks = context.tracker.update(det, pose_result.orig_img)
+        if len(tracks):
+            tracks = tracks.copy()
+            tracks[:, 4] = context.stream_track_ids(tracks[:, 4])
+        return tracks
+
+    def person_regions(self, frame_shape, person_boxes, union=False):
+        """Padded, frame-clipped crop rectangles around people (or one rectangle around all of them)"""
+        h, w = frame_shape[:2]
+        boxes = np.asarray(person_boxes, dtype=np.float32)
+        pad_x = (boxes[:, 2] - boxes[:, 0]) * self.ppe_crop_padding
+        pad_y = (boxes[:, 3] - boxes[:, 1]) * self.ppe_crop_padding
+        regions = np.stack([boxes[:, 0] - pad_x, boxes[:, 1] - pad_y, boxes[:, 2] + pad_x, boxes[:, 3] + pad_y], axis=1)
+        if union:
+            regions = np.array([[regions[:, 0].min(), regions[:, 1].min(), regions[:, 2].max(), regions[:, 3].max()]])
+        regions = np.clip(regions, 0, [w, h, w, h]).astype(int)
+        return [tuple(int(v) for v in r) for r in regions if r[2] - r[0] > 1 and r[3] - r[1] > 1]
+
+    def dedupe_equipment(self, equip_data, iou_threshold=0.6):
+        """Drops same-class duplicates produced by overlapping person crops (keeps the most confident)"""
+        kept = []
+        for equip in sorted(equip_data, key=lambda e: e['conf'], reverse=True):
+            b = equip['bbox']
+            duplicate = False
+            for other in kept:
+                if other['class'] != equip['class']:
+                    continue
+                o = other['bbox']
+                iw = min(b[2], o[2]) - max(b[0], o[0])
+                ih = min(b[3], o[3]) - max(b[1], o[1])
+                if iw <= 0 or ih <= 0:
+                    continue
+                inter = iw * ih
+                union = (b[2] - b[0]) * (b[3] - b[1]) + (o[2] - o[0]) * (o[3] - o[1]) - inter
+                if inter / union > iou_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(equip)
+        return kept
+
+    def detect_equipment(self, frames, pose_outputs, inputs=None, sizes=None):
+        """Runs the PPE model for a batch, given each frame's (tracked) people.
+
+        Equipment only ever counts when it overlaps a person, so frames without
+        people skip the PPE model entirely. In 'full' mode the model sees each
+        stream's inference input (`inputs`: (image, scale, offset) per frame, the
+        whole frame if omitted) at its `sizes` entry, in 'crops' mode a batch of padded person crops of
+        the original frames, in 'roi' mode one crop around all people per frame;
+        boxes are mapped back to frame coordinates either way.
+        """
+        equip_outputs = [[] for _ in frames]
+        if self.obj_model is None:
+            return equip_outputs
+
+        busy = [i for i, pose_data in enumerate(pose_outputs) if pose_data is not None and len(pose_data['bboxes'])]
+        self.ppe_frames_skipped += len(frames) - len(busy)
+        if not busy:
+            return equip_outputs
+
+        if self.ppe_mode == 'full':
+            if inputs is None:
+                inputs = [(frame, 1.0, (0, 0)) for frame in frames]
+            if sizes is None:
+                sizes = [None] * len(frames)
+            for imgsz, group in self.size_groups(busy, sizes):
+                obj_results = self.obj_model([inputs[i][0] for i in group], verbose=False, device=self.device,
+                                             half=self.half, conf=0.10, **({'imgsz': imgsz} if imgsz else {}))
+                for i, obj_result in zip(group, obj_results):
+                    _, scale, offset = inputs[i]
+                    equip_outputs[i] = self.extract_equipment(obj_result, offset=offset, scale=scale)
+            return equip_outputs
+
+        crops, owners = [], []
+        for i in busy:
+            for x1, y1, x2, y2 in self.person_regions(frames[i].shape, pose_outputs[i]['bboxes'], union=self.ppe_mode == 'roi'):
+                crops.append(frames[i][y1:y2, x1:x2])
+                owners.append((i, x1, y1))
+        if not crops:
+            return equip_outputs
+
+        obj_results = self.obj_model(crops, verbose=False, device=self.device, half=self.half, conf=0.10, imgsz=self.ppe_crop_imgsz)
+        for (i, x1, y1), obj_result in zip(owners, obj_results):
+            equip_outputs[i].extend(self.extract_equipment(obj_result, offset=(x1, y1)))
+
+        if self.ppe_mode == 'crops':
+            equip_outputs = [self.dedupe_equipment(equip_data) for equip_data in equip_outputs]
+        return equip_outputs
+
+    def infer_batch(self, frames, contexts):
+        """Runs pose + PPE once over a batch of frames (one per stream context).
+
+        Each context's tracker and detection cache is updated, and the list of
+        (pose_data, equip_data) aligned with frames is returned.
+        """
+        if not frames:
+            return []
+
+        # Each stream's ROI crop, downscaled to its inference size
+        inputs = [context.inference_input(frame) for context, frame in zip(contexts, frames)]
+        sizes = [context.inference_size for context in contexts]
+
+        with self._model_lock:
+            started = time.perf_counter()
+            pose_results = [None] * len(frames)
+            for imgsz, group in self.size_groups(range(len(frames)), sizes):
+                results = self.pose_model.predict(
+                    [inputs[i][0] for i in group],
+                    verbose=False,
+                    device=self.device,
+                    half=self.half,
+                    **({'imgsz': imgsz} if imgsz else {})
+                )
+                for i, result in zip(group, results):
+                    pose_results[i] = result
+
+            pose_outputs = []
+            for context, pose_result, (_, scale, offset) in zip(contexts, pose_results, inputs):
+                tracks = self.update_tracker(context, pose_result)
+                pose_outputs.append(self.map_pose(self.extract_pose(pose_result, tracks), scale, offset))
+
+            pose_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            equip_outputs = self.detect_equipment(frames, pose_outputs, inputs, sizes)
+            ppe_seconds = time.perf_counter() - started
+
+        # Batch latency, as every stream in the batch sees it
+        for context in contexts:
+            stage_metrics.observe("pose", context.stream_id, pose_seconds)
+            stage_metrics.observe("ppe", context.stream_id, ppe_seconds)
+
+        outputs = []
+        for context, pose_data, equip_data in zip(contexts, pose_outputs, equip_outputs):
+            context.last_pose_data = pose_data
+            context.last_equip_data = equip_data
+            outputs.append((pose_data, equip_data))
+        return outputs
 
     def compute_compliance(self, pose_data, equip_data, override_requirements=None):
         """Re-evaluates compliance logic based on inputs and CURRENT settings"""
@@ -172,23 +710,31 @@ class SafetyMonitor:
 
         if pose_data:
             ids = pose_data['ids']
-            bboxes = pose_data['bboxes']
-            kps_all = pose_data['kps']
-
-            for person_id, bbox, kps in zip(ids, bboxes, kps_all):
+            bboxes = np.asarray(pose_data['bboxes'])
+            kps_all = np.asarray(pose_data['kps'])
+            scores = pose_data.get('scores')
+
+            # Only equipment that maps to a known gear type can be associated
+            gear_equip = []
+            for equip in equip_data:
+                simple_name = equip.get('gear') or self.normalize_gear(equip['class'])
+                if simple_name:
+                    gear_equip.append((equip, simple_name))
+
+            if gear_equip:
+                equip_boxes = np.asarray([equip['bbox'] for equip, _ in gear_equip])
+                equip_gear = np.asarray([self.GEAR_NAMES.index(name) for _, name in gear_equip])
+                matches = self.associate_equipment(bboxes, kps_all, equip_boxes, equip_gear)
+            else:
+                matches = np.zeros((len(bboxes), 0), dtype=bool)
+
+            for p, (person_id, bbox) in enumerate(zip(ids, bboxes)):
                 person_gear = set()
-                
-                for equip in equip_data:
-                    e_bbox = equip['bbox']
-                    e_name = equip['class']
-                    # Normalize names
-                    simple_name = next((k for k in ['mask', 'gloves', 'coverall', 'goggles', 'face_shield'] if k in e_name.lower()), None)
-
-                    if simple_name:
-                        if self.is_overlapping(bbox, e_bbox):
-                            if self.check_keypoint_association(e_bbox, kps, simple_name):
-                                person_gear.add(simple_name)
-                                current_visuals.append({'type': 'rect', 'coords': e_bbox, 'color': (0, 255, 0), 'text': e_name})
+
+                for j in np.flatnonzero(matches[p]):
+                    equip, simple_name = gear_equip[j]
+                    person_gear.add(simple_name)
+                    current_visuals.append({'type': 'rect', 'coords': equip['bbox'], 'color': (0, 255, 0), 'text': equip['class']})
 
                 # Compliance Check against current target_requirements
                 missing = target_requirements - person_gear
@@ -203,7 +749,8 @@ class SafetyMonitor:
                     "timestamp": datetime.now().isoformat(),
                     "status": status,
                     "detected": list(person_gear),
-                    "missing": list(missing)
+                    "missing": list(missing),
+                    "confidence": round(float(scores[p]), 3) if scores is not None else None
                 })
 
         return current_visuals, persons_data
@@ -0,0 +1,114 @@
+import threading
+
+
+class FrameBroadcaster:
+    """Runs one camera's processing loop once and fans the result out to every viewer.
+
+    A producer thread pulls the newest frame from the camera's CameraCapture,
+    hands it to `process_fn` (inference + annotation + JPEG encoding) and publishes
+    the returned payload. Each subscriber only ever sees the latest payload, so a
+    slow client skips frames instead of slowing the producer down.
+
+    The producer starts with the first subscriber and stops when the last one leaves;
+    `on_stop` (optional) is called each time it stops.
+    """
+
+    def __init__(self, cam_id, capture, process_fn, on_stop=None):
+        self.cam_id = cam_id
+        self.capture = capture
+        self.process_fn = process_fn
+        self.on_stop = on_stop
+
+        self._cond = threading.Condition()
+        self._payload = None
+        self._seq = 0
+        self._subscribers = 0
+        self._thread = None
+        self._closed = False
+
+        # Counters
+        self.frames_published = 0
+        self.frames_skipped_by_clients = 0
+        self.errors = 0
+
+    # --- PRODUCER ---
+    def _ensure_producer(self):
+        # Caller holds self._cond
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name=f"broadcast-{self.cam_id}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            with self._cond:
+                stopping = self._closed or self._subscribers == 0
+                if stopping:
+                    self._thread = None
+                    self._cond.notify_all()
+            if stopping:
+                if self.on_stop:
+                    self.on_stop()
+                return
+
+            last_seq, frame = self.capture.read_latest(last_seq, timeout=1.0)
+            if frame is None:
+                if not self.capture.is_running():
+                    self.close()
+                continue
+
+            try:
+                payload = self.process_fn(frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"[STREAM ERROR] {self.cam_id}: {e}")
+                continue
+
+            with self._cond:
+                self._payload = payload
+                self._seq += 1
+                self.frames_published += 1
+                self._cond.notify_all()
+
+    # --- CONSUMERS ---
+    def subscribe(self, timeout=1.0):
+        """Generator yielding the newest payload each time a new one is published"""
+        with self._cond:
+            if self._closed:
+                return
+            self._subscribers += 1
+            self._ensure_producer()
+            last_seq = self._seq
+
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq or self._closed, timeout=timeout)
+                    if self._closed:
+                        return
+                    if self._seq == last_seq:
+                        continue
+                    if last_seq and self._seq > last_seq + 1:
+                        self.frames_skipped_by_clients += self._seq - last_seq - 1
+                    last_seq = self._seq
+                    payload = self._payload
+                yield payload
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            "subscribers": self._subscribers,
+            "frames_published": self.frames_published,
+            "frames_skipped_by_clients": self.frames_skipped_by_clients,
+            "errors": self.errors,
+        }
@@ -0,0 +1,55 @@
+from adaptive_stream import QUALITY_LEVELS, AdaptiveStreamClient
+
+
+def _deliver(client, kbps, start, seconds=2.0, fps=10, rtt=0.05):
+    """Sends and acks frames adding up to `kbps` over `seconds`; returns the end time"""
+    nbytes = int(kbps * 1000 / 8 / fps)
+    now = start
+    for _ in range(int(seconds * fps)):
+        seq = client.on_sent(nbytes, now=now)
+        client.on_ack(seq, now=now + rtt)
+        now += 1.0 / fps
+    return now
+
+
+def test_adapt_waits_for_the_interval():
+    client = AdaptiveStreamClient("cam", target_kbps=1000, adapt_interval=2.0)
+    now = _deliver(client, 5000, client.connected_at, seconds=1.0)
+    assert client.adapt(now=now) is False
+    assert client.level == 0
+
+
+def test_overshooting_the_target_steps_quality_down():
+    client = AdaptiveStreamClient("cam", target_kbps=1000, adapt_interval=2.0)
+    now = _deliver(client, 2000, client.connected_at)
+    assert client.adapt(now=now) is True
+    assert client.level == 1
+    assert client.encode_params() == (QUALITY_LEVELS[1][1], QUALITY_LEVELS[1][0])
+
+
+def test_headroom_steps_quality_back_up():
+    client = AdaptiveStreamClient("cam", target_kbps=1000, adapt_interval=2.0, level=3)
+    now = _deliver(client, 300, client.connected_at)
+    assert client.adapt(now=now) is True
+    assert client.level == 2
+
+
+def test_skips_only_lower_quality_when_the_link_is_queueing():
+    client = AdaptiveStreamClient("cam", target_kbps=1000, adapt_interval=2.0, level=2)
+    now = _deliver(client, 700, client.connected_at, rtt=0.05)
+    client.on_skipped()
+    assert client.adapt(now=now) is False       # plain latency: within 1.5 x min RTT
+    assert client.level == 2
+
+    seq = client.on_sent(1000, now=now)
+    client.on_ack(seq, now=now + 0.5)           # RTT far above its minimum
+    client.on_skipped()
+    assert client.adapt(now=now + 2.5) is True
+    assert client.level == 3
+
+
+def test_level_stays_on_the_ladder():
+    client = AdaptiveStreamClient("cam", target_kbps=10, adapt_interval=2.0, level=99)
+    assert client.level == len(QUALITY_LEVELS) - 1
+    now = _deliver(client, 5000, client.connected_at)
+    assert client.adapt(now=now) is False
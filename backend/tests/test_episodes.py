@@ -0,0 +1,57 @@
+from episodes import EpisodeAggregator
+
+
+def _entry(person_id, missing=(), detected=(), confidence=0.5, timestamp="2024-05-01T12:00:00"):
+    return {
+        "id": person_id,
+        "status": "VIOLATION" if missing else "COMPLIANT",
+        "missing": list(missing),
+        "detected": list(detected),
+        "confidence": confidence,
+        "timestamp": timestamp,
+    }
+
+
+def test_same_state_extends_the_open_episode():
+    aggregator = EpisodeAggregator(lost_after=2.0)
+    opened, closed = aggregator.update("cam", [_entry(1, ["mask"], confidence=0.4)], 0.0)
+    assert [e["id"] for e in opened] == [1] and closed == []
+
+    opened, closed = aggregator.update("cam", [_entry(1, ["mask"], ["gloves"], confidence=0.9)], 0.5)
+    assert opened == [] and closed == []
+
+    (episode,) = aggregator.flush("cam")["cam"]
+    assert episode["frame_count"] == 2
+    assert episode["duration"] == 0.5
+    assert episode["confidence"] == 0.9
+    assert episode["detected"] == ["gloves"]
+
+
+def test_status_or_missing_gear_change_closes_the_episode():
+    aggregator = EpisodeAggregator()
+    aggregator.update("cam", [_entry(1, ["mask"])], 0.0)
+    opened, closed = aggregator.update("cam", [_entry(1, ["mask", "gloves"])], 0.1)
+    assert [e["missing"] for e in closed] == [["mask"]]
+    assert [e["missing"] for e in opened] == [["gloves", "mask"]]
+
+    opened, closed = aggregator.update("cam", [_entry(1)], 0.2)
+    assert [e["status"] for e in closed] == ["VIOLATION"]
+    assert [e["status"] for e in opened] == ["COMPLIANT"]
+
+
+def test_unseen_track_closes_after_lost_after():
+    aggregator = EpisodeAggregator(lost_after=1.0)
+    aggregator.update("cam", [_entry(1, ["mask"]), _entry(2)], 0.0)
+    _, closed = aggregator.update("cam", [_entry(2)], 0.8)
+    assert closed == []
+    _, closed = aggregator.update("cam", [_entry(2)], 1.5)
+    assert [e["id"] for e in closed] == [1]
+    assert aggregator.stats() == {"open": 1, "closed": 1, "entries_seen": 4}
+
+
+def test_sources_are_independent():
+    aggregator = EpisodeAggregator(lost_after=1.0)
+    aggregator.update("a", [_entry(1)], 0.0)
+    _, closed = aggregator.update("b", [], 5.0)
+    assert closed == []
+    assert list(aggregator.flush()) == ["a"]
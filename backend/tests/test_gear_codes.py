@@ -0,0 +1,37 @@
+import pytest
+
+from gear_codes import GEAR_BITS, decode_gear, encode_gear, masks_with, normalize_gear_names, unknown_gear
+
+
+def test_encode_decode_round_trip():
+    assert encode_gear(["mask", "gloves"]) == GEAR_BITS["mask"] | GEAR_BITS["gloves"]
+    assert decode_gear(encode_gear(["Mask", "coverall"])) == ["coverall", "mask"]   # class id order
+    assert encode_gear(None) == 0
+    assert decode_gear(0) == []
+    assert decode_gear(None) == []
+
+
+def test_encode_skips_unknown_names():
+    assert encode_gear(["mask", "helmet"]) == GEAR_BITS["mask"]
+    assert unknown_gear(["mask", "Helmet"]) == ["Helmet"]
+
+
+def test_masks_with_lists_every_mask_containing_the_gear():
+    masks = masks_with("goggles")
+    bit = GEAR_BITS["goggles"]
+    assert len(masks) == 2 ** (len(GEAR_BITS) - 1)
+    assert all(mask & bit for mask in masks)
+    assert encode_gear(["goggles", "mask"]) in masks
+    assert encode_gear(["mask"]) not in masks
+    assert masks_with("helmet") == []
+
+
+def test_normalize_gear_names_lowercases_known_names():
+    assert normalize_gear_names(["Mask", " Face_Shield"]) == ["mask", "face_shield"]
+    assert normalize_gear_names([]) == []
+
+
+@pytest.mark.parametrize("names", [5, "mask", [1], ["mask", None], ["helmet"]])
+def test_normalize_gear_names_rejects_anything_else(names):
+    with pytest.raises(ValueError):
+        normalize_gear_names(names)
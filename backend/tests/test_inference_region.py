@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from inference_region import InferenceRegion
+
+
+def test_map_boxes_undoes_crop_and_scale():
+    region = InferenceRegion(rois=[[400, 200, 1200, 1000]], inference_size=320)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    image, scale, offset = region.prepare(frame)
+    assert offset == (400, 200)
+    assert max(image.shape[:2]) == 320 and scale == pytest.approx(320 / 800)
+
+    boxes = np.array([[0, 0, 320, 320], [32, 64, 96, 128]], dtype=np.float32)
+    mapped = InferenceRegion.map_boxes(boxes, scale, offset)
+    np.testing.assert_allclose(mapped[0], [400, 200, 1200, 1000], atol=1e-3)
+    np.testing.assert_allclose(mapped[1], [480, 360, 640, 520], atol=1e-3)
+
+
+def test_map_boxes_without_crop_or_scale_is_identity():
+    boxes = np.array([[1, 2, 3, 4]], dtype=np.float32)
+    np.testing.assert_array_equal(InferenceRegion.map_boxes(boxes, 1.0, (0, 0)), boxes)
+
+
+def test_map_points_keeps_invisible_keypoints():
+    points = np.array([[[10, 20], [0, 0]]], dtype=np.float32)
+    mapped = InferenceRegion.map_points(points, 0.5, (100, 50))
+    np.testing.assert_allclose(mapped, [[[120, 90], [0, 0]]])
+
+
+def test_fractional_rois_scale_with_the_frame():
+    region = InferenceRegion(rois=[[0.25, 0.5, 0.75, 1.0]])
+    _, scale, offset = region.prepare(np.zeros((400, 800, 3), dtype=np.uint8))
+    assert (scale, offset) == (1.0, (200, 200))
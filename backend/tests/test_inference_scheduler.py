@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+class _Context:
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.latencies = []
+
+    def record_inference(self, seconds):
+        self.latencies.append(seconds)
+
+
+class _Monitor:
+    """Just the SafetyMonitor surface the scheduler uses"""
+
+    def __init__(self, *stream_ids):
+        self.contexts = {stream_id: _Context(stream_id) for stream_id in stream_ids}
+
+    def find_context(self, stream_id):
+        return self.contexts.get(stream_id)
+
+    def get_context(self, stream_id):
+        raise AssertionError("the scheduler must not create contexts")
+
+    def release_context(self, stream_id):
+        self.contexts.pop(stream_id, None)
+
+    def infer_batch(self, frames, contexts):
+        return [(frame, context.stream_id) for frame, context in zip(frames, contexts)]
+
+
+def test_batches_frames_of_known_streams():
+    monitor = _Monitor("a", "b")
+    scheduler = InferenceScheduler(monitor, max_batch_size=2, max_wait_ms=500)
+    scheduler.start()
+    try:
+        futures = [scheduler.submit("a", 1), scheduler.submit("b", 2)]
+        assert [fut.result(timeout=2) for fut in futures] == [(1, "a"), (2, "b")]
+        assert scheduler.stats()["batches"] == 1
+        assert monitor.contexts["a"].latencies
+    finally:
+        scheduler.stop()
+
+
+def test_frames_of_discarded_streams_are_dropped():
+    monitor = _Monitor("a", "b")
+    scheduler = InferenceScheduler(monitor, max_batch_size=2, max_wait_ms=200)
+    scheduler.start()
+    try:
+        gone = scheduler.submit("gone", 0)        # stream whose context was already released
+        kept = scheduler.submit("a", 1)
+        with pytest.raises(RuntimeError):
+            gone.result(timeout=2)
+        assert kept.result(timeout=2) == (1, "a")
+        assert "gone" not in monitor.contexts
+    finally:
+        scheduler.stop()
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+import pytest
+
+from log_service import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 13, 45, 12, 123456)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "MjAyNC0wNS0wMQ==", "Zm9vfGJhcg=="])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,36 @@
+import pytest
+
+from metrics import LATENCY_BUCKETS, Histogram
+
+
+def test_empty_histogram_has_no_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    assert histogram.summary()["p99_ms"] is None
+
+
+def test_quantile_interpolates_within_the_bucket():
+    histogram = Histogram()
+    for _ in range(100):
+        histogram.observe(0.007)            # (0.005, 0.01] bucket
+    assert LATENCY_BUCKETS[2] < histogram.quantile(0.5) <= 0.007
+    assert histogram.quantile(1.0) == pytest.approx(0.007)  # capped at the observed max
+
+
+def test_quantiles_follow_the_distribution():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.observe(0.002)
+    for _ in range(10):
+        histogram.observe(0.3)
+    assert histogram.quantile(0.5) <= 0.0025
+    assert 0.25 < histogram.quantile(0.95) <= 0.3
+    assert histogram.quantile(0.5) <= histogram.quantile(0.9) <= histogram.quantile(0.99)
+
+
+def test_values_beyond_the_last_bucket_use_the_max():
+    histogram = Histogram()
+    histogram.observe(12.0)
+    assert histogram.counts[-1] == 1
+    assert histogram.quantile(0.99) <= 12.0
+    assert histogram.summary()["max_ms"] == 12000.0
@@ -0,0 +1,30 @@
+from recent_events import RecentEvents
+
+
+def _events(*statuses):
+    return [{"id": i, "status": status} for i, status in enumerate(statuses)]
+
+
+def test_eviction_keeps_counters_and_violation_index_in_sync():
+    events = RecentEvents(capacity=3)
+    events.add(_events("VIOLATION", "COMPLIANT", "VIOLATION"))
+    assert events.counts()["violations"] == 2
+
+    events.add([{"id": 10, "status": "COMPLIANT"}])     # evicts the oldest violation
+    assert len(events) == 3
+    assert [e["id"] for e in events.latest()] == [10, 2, 1]
+    assert [e["id"] for e in events.latest_violations()] == [2]
+    assert events.counts() == {"total": 3, "violations": 1, "compliant": 2, "compliance_rate": 66.7}
+
+    events.add(_events("COMPLIANT", "COMPLIANT"))         # evicts 1 (compliant) and 2 (violation)
+    assert events.latest_violations() == []
+    assert events.counts()["violations"] == 0
+    assert events.total_added == 6
+
+
+def test_latest_is_newest_first_and_limited():
+    events = RecentEvents(capacity=10)
+    events.add(_events(*["VIOLATION"] * 5))
+    assert [e["id"] for e in events.latest(2)] == [4, 3]
+    assert [e["id"] for e in events.latest_violations(3)] == [4, 3, 2]
+    assert RecentEvents().counts()["compliance_rate"] == 100
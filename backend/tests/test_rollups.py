@@ -0,0 +1,100 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from gear_codes import GEAR_BITS
+from log_service import LogWriter
+from models import Log
+from rollups import rebuild_rollups, summarize
+
+START = datetime(2024, 5, 1, 22, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    eng = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=eng)
+    rng = random.Random(7)
+    gear = sorted(GEAR_BITS)
+    # Same path as production: LogWriter batches insert the logs and update the rollups
+    writer = LogWriter(sessionmaker(bind=eng), batch_size=70)
+    for source in ("Gate", "Dock"):
+        entries = []
+        for _ in range(300):
+            missing = rng.sample(gear, rng.randint(0, 2))
+            detected = rng.sample([g for g in gear if g not in missing], rng.randint(0, 2))
+            timestamp = START + timedelta(seconds=rng.randint(0, 5 * 3600))   # spans midnight
+            entries.append({"id": rng.randint(1, 9), "timestamp": timestamp.isoformat(),
+                            "detected": detected, "missing": missing})
+        writer.enqueue(entries, source)
+    # Never started: stop() writes the queue inline in batch_size batches, so rollup rows
+    # are incremented as well as created
+    writer.stop()
+    assert writer.rows_written == 600
+    return eng
+
+
+def _raw_summary(db, start=None, end=None, source=None):
+    """The same result computed straight from the logs table"""
+    query = db.query(Log)
+    if start is not None:
+        query = query.filter(Log.timestamp >= start)
+    if end is not None:
+        query = query.filter(Log.timestamp <= end)
+    if source is not None:
+        query = query.filter(Log.source == source)
+    days, sources = defaultdict(lambda: [0, 0]), defaultdict(int)
+    detected, missing = defaultdict(int), defaultdict(int)
+    for log in query:
+        day = log.timestamp.date().isoformat()
+        days[day][0] += 1
+        if log.is_violation:
+            days[day][1] += 1
+            sources[log.source] += 1
+        for g in log.detected:
+            detected[g] += 1
+        for g in log.missing:
+            missing[g] += 1
+    return {
+        "detected": dict(sorted(detected.items())),
+        "missing": dict(sorted(missing.items())),
+        "violationTrend": [{"date": d, "violations": v} for d, (t, v) in sorted(days.items()) if v],
+        "complianceTrend": [{"date": d, "score": round((t - v) / t * 100, 1)} for d, (t, v) in sorted(days.items())],
+        "cameraPerformance": [{"camera": s, "violations": v} for s, v in sorted(sources.items()) if v],
+    }
+
+
+RANGES = [
+    (None, None, None),
+    (None, None, "Gate"),
+    (START + timedelta(minutes=17, seconds=3), START + timedelta(hours=3, minutes=41), None),
+    (START + timedelta(hours=1), START + timedelta(hours=3), "Dock"),        # whole hours only
+    (START + timedelta(minutes=5), START + timedelta(minutes=50), None),     # inside one hour
+    (START + timedelta(hours=2, minutes=30), None, None),
+    (None, START + timedelta(hours=1, seconds=1), "Gate"),
+]
+
+
+@pytest.mark.parametrize("start,end,source", RANGES)
+def test_summarize_matches_a_raw_query(engine, start, end, source):
+    db = sessionmaker(bind=engine)()
+    try:
+        assert summarize(db, start, end, source) == _raw_summary(db, start, end, source)
+    finally:
+        db.close()
+
+
+def test_rebuild_reproduces_the_incremental_rollups(engine):
+    db = sessionmaker(bind=engine)()
+    try:
+        before = summarize(db, START + timedelta(minutes=30), START + timedelta(hours=4, minutes=10))
+        rebuild_rollups(engine)
+        assert summarize(db, START + timedelta(minutes=30), START + timedelta(hours=4, minutes=10)) == before
+    finally:
+        db.close()
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from safety_engine import SafetyMonitor
+
+
+@pytest.fixture(scope="module")
+def monitor():
+    # No PPE weights and lazy loading: nothing is loaded, compute_compliance only needs the tables
+    return SafetyMonitor(obj_model_path="missing-ppe-model.pt", lazy=True)
+
+
+def _loop_compliance(monitor, pose_data, equip_data, requirements):
+    """compute_compliance before vectorization: every person x equipment pair checked in Python"""
+    persons = []
+    for person_id, bbox, kps in zip(pose_data['ids'], pose_data['bboxes'], pose_data['kps']):
+        person_gear = set()
+        for equip in equip_data:
+            simple_name = next((k for k in ['mask', 'gloves', 'coverall', 'goggles', 'face_shield']
+                                if k in equip['class'].lower()), None)
+            if simple_name and monitor.is_overlapping(bbox, equip['bbox']) \
+                    and monitor.check_keypoint_association(equip['bbox'], kps, simple_name):
+                person_gear.add(simple_name)
+        missing = requirements - person_gear
+        persons.append((int(person_id), "VIOLATION" if missing else "COMPLIANT", sorted(person_gear), sorted(missing)))
+    return persons
+
+
+def _scene(rng, n_persons, n_equip):
+    classes = ['Coverall', 'Face_Shield', 'Gloves', 'Goggles', 'Mask', 'Helmet']   # Helmet: not a gear type
+    xy = rng.uniform(0, 500, size=(n_persons, 2))
+    bboxes = np.hstack([xy, xy + rng.uniform(80, 200, size=(n_persons, 2))])
+    kps = np.concatenate([
+        rng.uniform(bboxes[:, None, :2], bboxes[:, None, 2:], size=(n_persons, 17, 2)),
+        rng.uniform(0, 1, size=(n_persons, 17, 1)),
+    ], axis=2)
+    exy = rng.uniform(0, 650, size=(n_equip, 2))
+    equip = [{'bbox': [*p, *(p + rng.uniform(10, 120, size=2))], 'class': classes[rng.integers(len(classes))]}
+             for p in exy]
+    pose = {'ids': np.arange(1, n_persons + 1), 'bboxes': bboxes, 'kps': kps, 'scores': rng.uniform(0.3, 1, n_persons)}
+    return pose, equip
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_compliance_matches_the_loop(monitor, seed):
+    rng = np.random.default_rng(seed)
+    pose, equip = _scene(rng, n_persons=int(rng.integers(1, 8)), n_equip=int(rng.integers(0, 25)))
+    requirements = {'mask', 'gloves', 'goggles'}
+
+    _, persons = monitor.compute_compliance(pose, equip, override_requirements=requirements)
+    got = [(p["id"], p["status"], sorted(p["detected"]), sorted(p["missing"])) for p in persons]
+    assert got == _loop_compliance(monitor, pose, equip, requirements)
+
+
+def test_no_people_means_no_entries(monitor):
+    assert monitor.compute_compliance(None, [{'bbox': [0, 0, 10, 10], 'class': 'Mask'}]) == ([], [])
+
+
+
+def test_unknown_ppe_mode_is_rejected():
+    with pytest.raises(ValueError):
+        SafetyMonitor(obj_model_path="missing-ppe-model.pt", lazy=True, ppe_mode="crop")
+
+
+def test_unknown_required_gear_is_rejected(monitor):
+    with pytest.raises(ValueError):
+        monitor.update_requirements(['mask', 'helmet'])
+    monitor.update_requirements(['Mask', 'GLOVES'])
+    assert monitor.REQUIRED_GEAR == {'mask', 'gloves'}
+
+
+def _pose_result(boxes):
+    """Pose-model output with only what update_tracker reads: boxes (xyxy, conf, cls) and the image"""
+    from types import SimpleNamespace
+    from ultralytics.engine.results import Boxes
+    data = np.array([[*box, 0.9, 0] for box in boxes], dtype=np.float32).reshape(-1, 6)
+    return SimpleNamespace(boxes=Boxes(data, (720, 1280)), orig_img=np.zeros((720, 1280, 3), dtype=np.uint8))
+
+
+def _people(frame, count):
+    # `count` people standing in a row, drifting slowly to the right
+    return [(100 + 150 * i + frame, 200, 200 + 150 * i + frame, 500) for i in range(count)]
+
+
+def test_track_ids_are_per_stream_and_survive_other_trackers(monitor):
+    a = monitor.get_context("ids:a")
+    b = monitor.get_context("ids:b")
+    seen_a, seen_b = [], []
+
+    def step(frame, people_a, people_b):
+        ids_a = sorted(int(i) for i in monitor.update_tracker(a, _pose_result(_people(frame, people_a)))[:, 4])
+        ids_b = sorted(int(i) for i in monitor.update_tracker(b, _pose_result(_people(frame, people_b)))[:, 4])
+        assert len(set(ids_a)) == len(ids_a) and len(set(ids_b)) == len(ids_b)
+        seen_a.append(ids_a)
+        seen_b.append(ids_b)
+
+    for frame in range(5):
+        step(frame, 3, 2)
+    # Re-creating b's tracker (as a new region does), and a brand-new stream, must not renumber a
+    b.configure_region()
+    monitor.get_context("ids:c")
+    monitor.update_tracker(monitor.get_context("ids:c"), _pose_result(_people(0, 4)))
+    for frame in range(5, 10):
+        step(frame, 4 if frame >= 7 else 3, 2)
+
+    assert seen_a[4] == seen_a[5] == [1, 2, 3]           # a's people keep their IDs
+    assert seen_a[-1] == [1, 2, 3, 4]                    # the newcomer continues a's numbering
+    # b's new tracker continues b's numbering instead of reusing its earlier IDs
+    assert seen_b[4] == [1, 2]
+    assert min(seen_b[-1]) > max(seen_b[4])
+
+    for context in ("ids:a", "ids:b", "ids:c"):
+        monitor.release_context(context)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import time
+
+from video_jobs import VideoJobQueue
+
+
+def _upload():
+    fd, path = tempfile.mkstemp(prefix="upload_")
+    os.close(fd)
+    return path
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _queue(gate, discarded):
+    def handler(job, input_path):
+        gate.wait(timeout=2)
+        os.remove(input_path)
+        return "ok"
+
+    def on_discard(job):
+        discarded.append(job.id)
+        os.remove(job.params["input_path"])
+
+    return VideoJobQueue(handler, max_workers=1, on_discard=on_discard)
+
+
+def test_job_cancelled_while_queued_is_discarded():
+    gate, discarded = threading.Event(), []
+    queue = _queue(gate, discarded)
+    first = queue.submit("a.mp4", input_path=_upload())
+    second = queue.submit("b.mp4", input_path=_upload())
+    assert _wait_for(lambda: first.status == "running")
+
+    queue.cancel(second.id)
+    gate.set()
+    assert _wait_for(lambda: second.id in discarded)
+    assert second.status == "cancelled"
+    assert not os.path.exists(second.params["input_path"])
+    assert _wait_for(lambda: first.status == "done")
+    assert discarded == [second.id]
+    queue.shutdown()
+
+
+def test_jobs_dropped_at_shutdown_are_discarded_once():
+    gate, discarded = threading.Event(), []
+    queue = _queue(gate, discarded)
+    running = queue.submit("a.mp4", input_path=_upload())
+    waiting = [queue.submit(f"{i}.mp4", input_path=_upload()) for i in range(3)]
+    assert _wait_for(lambda: running.status == "running")
+    queue.cancel(waiting[0].id)
+
+    threading.Timer(0.1, gate.set).start()
+    queue.shutdown()
+
+    assert sorted(discarded) == sorted(job.id for job in waiting)
+    for job in waiting:
+        assert job.status == "cancelled"
+        assert not os.path.exists(job.params["input_path"])
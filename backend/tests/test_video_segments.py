@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from video_segments import plan_segments, stitch_ids
+
+
+def _covers(segments, start, end):
+    """Write ranges are contiguous and cover [start, end) exactly once"""
+    assert segments[0][1] == start and segments[-1][2] == end
+    for (_, _, prev_end), (_, next_start, _) in zip(segments, segments[1:]):
+        assert prev_end == next_start
+
+
+def test_short_ranges_are_not_split():
+    assert plan_segments(0, 50, 4, overlap=10) == [(0, 0, 50)]
+    assert plan_segments(0, 5000, 1, overlap=10) == [(0, 0, 5000)]
+
+
+def test_segments_read_overlap_frames_before_they_write():
+    segments = plan_segments(100, 4100, 4, overlap=30)
+    assert len(segments) == 4
+    _covers(segments, 100, 4100)
+    assert segments[0][0] == segments[0][1] == 100
+    for read_start, write_start, _ in segments[1:]:
+        assert write_start - read_start == 30
+
+
+def test_read_starts_snap_to_keyframes():
+    keyframes = list(range(0, 4000, 250))
+    segments = plan_segments(0, 4000, 4, overlap=30, keyframes=keyframes)
+    _covers(segments, 0, 4000)
+    assert all(read_start in keyframes for read_start, _, _ in segments[1:])
+
+
+def _segment(ids, warmup=None, tail=None):
+    return {"ids": ids, "warmup": warmup or {}, "tail": tail or {}}
+
+
+def test_stitch_ids_follows_people_across_the_overlap():
+    box_a, box_b = (0, 0, 100, 200), (300, 0, 400, 200)
+    first = _segment([1, 2], tail={10: [(1, box_a), (2, box_b)], 11: [(1, box_a), (2, box_b)]})
+    # The second segment's tracker numbered the same people 1 -> 5 and 2 -> 4, plus a newcomer 7
+    second = _segment([4, 5, 7], warmup={10: [(5, box_a), (4, box_b)], 11: [(5, box_a), (4, (305, 0, 405, 200))]})
+
+    first_map, second_map = stitch_ids([first, second])
+    assert first_map == {1: 1, 2: 2}
+    assert second_map[5] == 1 and second_map[4] == 2
+    assert second_map[7] not in (1, 2)
+
+
+def test_unmatched_ids_get_fresh_numbers():
+    first = _segment([1, 2, 3], tail={10: [(3, (0, 0, 10, 10))]})
+    second = _segment([1], warmup={10: [(1, (500, 500, 600, 600))]})   # no overlap with anyone
+    _, second_map = stitch_ids([first, second])
+    assert second_map[1] > 3
@@ -0,0 +1,170 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job was cancelled"""
+
+
+class VideoJob:
+    """One uploaded video being analyzed in the background"""
+
+    def __init__(self, job_id, filename, params):
+        self.id = job_id
+        self.filename = filename
+        self.params = params
+        self.status = "queued"      # queued -> running -> done | failed | cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_done = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.stage_timings = None   # per-stage timing summary, if the handler records one
+        self.stage_latency = None   # per-stage latency percentiles, if the handler records them
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def update_progress(self, frames_done, total_frames=None):
+        self.frames_done = frames_done
+        if total_frames is not None:
+            self.total_frames = total_frames
+
+    def progress(self):
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        fps = self.frames_done / elapsed if elapsed else 0.0
+        remaining = max(self.total_frames - self.frames_done, 0)
+        eta = remaining / fps if fps > 0 and self.status == "running" else None
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "frames_done": self.frames_done,
+            "total_frames": self.total_frames,
+            "percent": round(100.0 * self.frames_done / self.total_frames, 1) if self.total_frames else None,
+            "fps": round(fps, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "stage_timings": self.stage_timings,
+            "stage_latency": self.stage_latency,
+            "error": self.error,
+        }
+
+
+class VideoJobQueue:
+    """Runs video analysis jobs on a small worker pool, off the FastAPI event loop.
+
+    `handler(job, **params)` does the actual work; it should call
+    job.update_progress() as it goes and job.check_cancelled() between frames.
+    Finished jobs are kept (most recent `max_history`) so results can be fetched.
+    `on_discard(job)` (optional) is called once for every job that never reaches the
+    handler (cancelled while queued, or dropped at shutdown), so whatever the
+    handler would have cleaned up, e.g. the uploaded file, can be released.
+    """
+
+    def __init__(self, handler, max_workers=1, max_history=100, on_discard=None):
+        self.handler = handler
+        self.max_history = max_history
+        self.on_discard = on_discard
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._discarded = set()     # ids of jobs already passed to on_discard
+
+    def submit(self, filename, **params):
+        job = VideoJob(uuid.uuid4().hex[:12], filename, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        if job.cancelled:
+            self._discard(job)
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = self.handler(job, **job.params)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"[JOB ERROR] {job.id}: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _discard(self, job):
+        with self._lock:
+            if job.id in self._discarded:
+                return
+            self._discarded.add(job.id)
+        job.status = "cancelled"
+        job.finished_at = job.finished_at or time.time()
+        if self.on_discard:
+            try:
+                self.on_discard(job)
+            except Exception as e:
+                print(f"[JOB ERROR] {job.id}: cleanup of discarded job failed: {e}")
+
+    def _trim_history(self):
+        # Caller holds self._lock; only finished jobs are ever dropped
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed", "cancelled")]
+        while len(self._jobs) > self.max_history and finished:
+            job_id = finished.pop(0)
+            del self._jobs[job_id]
+            self._discarded.discard(job_id)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [job.progress() for job in reversed(self._jobs.values())]
+
+    def status_counts(self):
+        """{status: number of jobs} over the kept history"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            if job.status in ("queued", "running"):
+                job.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        # Jobs whose futures were cancelled above never ran at all
+        for job in list(self._jobs.values()):
+            if job.started_at is None:
+                self._discard(job)
@@ -0,0 +1,175 @@
+import queue
+import threading
+import time
+
+from metrics import stage_metrics
+
+_END = object()
+
+# Pipeline stage -> stage name in the shared metrics
+METRIC_STAGES = {"decode": "capture", "infer": "process", "encode": "video_encode"}
+
+
+class StageStats:
+    """Accumulated busy time per pipeline stage"""
+
+    def __init__(self, *stages):
+        self._lock = threading.Lock()
+        self.seconds = {stage: 0.0 for stage in stages}
+        self.counts = {stage: 0 for stage in stages}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += 1
+
+    def summary(self):
+        return {
+            stage: {
+                "frames": self.counts[stage],
+                "total_s": round(self.seconds[stage], 3),
+                "avg_ms": round(1000 * self.seconds[stage] / self.counts[stage], 2) if self.counts[stage] else None,
+            }
+            for stage in self.seconds
+        }
+
+
+class VideoPipeline:
+    """Decode -> infer -> encode on three threads connected by bounded queues.
+
+    cv2 decoding/encoding and model inference all release the GIL, so VP8/mp4v
+    encoding and decoding overlap with inference instead of waiting for it.
+    The bounded queues cap memory and apply backpressure to the decoder.
+
+    - read_fn()            -> frame or None at end of stream (decode thread)
+    - process_fn(frame)    -> output item                     (inference thread, in order)
+    - write_fn(item)                                           (encode thread, in order)
+    - should_stop()        -> True to abort early (e.g. job cancelled)
+
+    With a metrics `scope`, stage latencies, FPS and queue depths are also
+    reported to the shared stage metrics while the pipeline runs.
+    """
+
+    def __init__(self, read_fn, process_fn, write_fn, max_frames=None,
+                 decode_queue_size=16, encode_queue_size=16, should_stop=None, scope=None):
+        self.read_fn = read_fn
+        self.process_fn = process_fn
+        self.write_fn = write_fn
+        self.max_frames = max_frames
+        self.should_stop = should_stop or (lambda: False)
+        self._decoded = queue.Queue(maxsize=decode_queue_size)
+        self._processed = queue.Queue(maxsize=encode_queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self.stats = StageStats("decode", "infer", "encode")
+        self.frames_written = 0
+        self.scope = scope
+
+    def _record(self, stage, seconds):
+        self.stats.add(stage, seconds)
+        if self.scope is not None:
+            stage_metrics.observe(METRIC_STAGES[stage], self.scope, seconds)
+
+    def queue_samples(self):
+        """Metrics collector: current depth of the two inter-stage queues"""
+        return [
+            ("queue_depth", "gauge", "Items waiting in a queue", {"scope": self.scope, "queue": name}, q.qsize())
+            for name, q in (("decoded", self._decoded), ("processed", self._processed))
+        ]
+
+    def _put(self, q, item):
+        # Blocking put that still notices a stop request
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _END
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _decode(self):
+        try:
+            count = 0
+            while not self._stop.is_set():
+                if self.max_frames is not None and count >= self.max_frames:
+                    break
+                if self.should_stop():
+                    self._stop.set()
+                    break
+                started = time.perf_counter()
+                frame = self.read_fn()
+                if frame is None:
+                    break
+                self._record("decode", time.perf_counter() - started)
+                count += 1
+                if not self._put(self._decoded, frame):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._decoded, _END)
+
+    def _infer(self):
+        try:
+            while True:
+                frame = self._get(self._decoded)
+                if frame is _END:
+                    break
+                started = time.perf_counter()
+                item = self.process_fn(frame)
+                self._record("infer", time.perf_counter() - started)
+                if not self._put(self._processed, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._processed, _END)
+
+    def _encode(self):
+        try:
+            while True:
+                item = self._get(self._processed)
+                if item is _END:
+                    break
+                started = time.perf_counter()
+                self.write_fn(item)
+                self._record("encode", time.perf_counter() - started)
+                self.frames_written += 1
+                if self.scope is not None:
+                    stage_metrics.tick(self.scope)
+        except Exception as e:
+            self._fail(e)
+
+    def run(self):
+        """Runs the pipeline to completion; re-raises the first stage error"""
+        threads = [
+            threading.Thread(target=self._decode, name="pipeline-decode", daemon=True),
+            threading.Thread(target=self._infer, name="pipeline-infer", daemon=True),
+            threading.Thread(target=self._encode, name="pipeline-encode", daemon=True),
+        ]
+        if self.scope is not None:
+            stage_metrics.add_collector(self.queue_samples)
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            if self.scope is not None:
+                stage_metrics.remove_collector(self.queue_samples)
+        if self._error is not None:
+            raise self._error
+        return self.frames_written
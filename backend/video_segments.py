@@ -0,0 +1,288 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+
+import cv2
+import numpy as np
+
+from episodes import EpisodeAggregator
+
+
+# --- WORKER PROCESS STATE (one SafetyMonitor per process) ---
+_monitor = None
+_progress = None
+_cancel = None
+
+
+def _init_worker(monitor_kwargs, settings, progress, cancel, threads):
+    global _monitor, _progress, _cancel
+    import torch
+    from safety_engine import SafetyMonitor
+
+    # Split the cores between workers instead of every worker grabbing all of them
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+    # Same runtime settings as the parent's monitor, so parallel=true gives the sequential results
+    _monitor = SafetyMonitor(**monitor_kwargs)
+    _monitor.general_conf = settings['general_conf']
+    _monitor.SKIP_FRAMES = settings['skip_frames']
+    _monitor.adaptive_skip = settings['adaptive_skip']
+    _monitor.target_fps = settings['target_fps']
+    _monitor.CLASS_SPECIFIC_THRESHOLDS = dict(settings['class_thresholds'])
+    _monitor.set_active(True)
+    _progress = progress
+    _cancel = cancel
+
+
+def _observations(pose_data):
+    if not pose_data:
+        return []
+    return [(int(pid), np.asarray(box, dtype=np.float32)) for pid, box in zip(pose_data['ids'], pose_data['bboxes'])]
+
+
+def _process_segment(task):
+    """Processes frames [read_start, write_end) of one segment in a worker process.
+
+    Frames before write_start only warm up the tracker (they belong to the previous
+    segment); their tracks are returned for ID stitching, as are the tracks of the
+    last `overlap` frames this segment writes.
+    """
+    index = task['index']
+    cap = cv2.VideoCapture(task['input_path'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, task['read_start'])
+    out = cv2.VideoWriter(task['output_path'], cv2.VideoWriter_fourcc(*task['fourcc']), task['fps'], task['size'])
+    context = _monitor.get_context(f"segment:{index}")
+
+    results, warmup, tail, ids = [], {}, {}, set()
+    tail_start = task['write_end'] - task['overlap']
+    frame_idx = task['read_start']
+    written = 0
+    try:
+        while frame_idx < task['write_end']:
+            if _cancel.value:
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            annotated_frame, data = _monitor.process_frame(
+                frame, override_requirements=task['requirements'], context=context, force=True
+            )
+            if frame_idx < task['write_start']:
+                warmup[frame_idx] = _observations(context.last_pose_data)
+            else:
+                if written == 0 and task['thumbnail_path']:
+                    cv2.imwrite(task['thumbnail_path'], annotated_frame)
+                out.write(annotated_frame)
+                written += 1
+                _progress[index] = written
+                for entry in data:
+                    ids.add(entry['id'])
+                    entry['frame'] = frame_idx
+                results.extend(data)
+                if frame_idx >= tail_start:
+                    tail[frame_idx] = _observations(context.last_pose_data)
+            frame_idx += 1
+    finally:
+        cap.release()
+        out.release()
+        _monitor.release_context(context.stream_id)
+
+    return {'index': index, 'path': task['output_path'], 'frames': written,
+            'results': results, 'ids': ids, 'warmup': warmup, 'tail': tail}
+
+
+# --- PLANNING ---
+def keyframe_indices(input_path, fps):
+    """Keyframe frame indices via ffprobe, or None if ffprobe isn't available"""
+    if not shutil.which("ffprobe") or fps <= 0:
+        return None
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+             "-show_entries", "frame=pts_time", "-of", "csv=p=0", input_path],
+            capture_output=True, text=True, timeout=300, check=True
+        ).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    times = [float(line.split(',')[0]) for line in output.splitlines() if line.strip() and line.split(',')[0] != 'N/A']
+    return sorted({int(round(t * fps)) for t in times})
+
+
+def plan_segments(start_frame, end_frame, n_segments, overlap, keyframes=None):
+    """Splits [start_frame, end_frame) into (read_start, write_start, write_end) triples.
+
+    Each segment after the first starts reading `overlap` frames early so its tracker
+    sees the same people the previous segment was tracking. With keyframes, read
+    starts are snapped to a keyframe so the seek lands exactly and cheaply.
+    """
+    total = end_frame - start_frame
+    if n_segments <= 1 or total < n_segments * max(overlap * 4, 1):
+        return [(start_frame, start_frame, end_frame)]
+
+    read_starts = []
+    for k in range(1, n_segments):
+        ideal = start_frame + (total * k) // n_segments - overlap
+        if keyframes:
+            candidates = [kf for kf in keyframes if start_frame < kf and kf + overlap < end_frame]
+            if candidates:
+                ideal = min(candidates, key=lambda kf: abs(kf - ideal))
+        read_starts.append(ideal)
+    read_starts = sorted(set(read_starts))
+
+    boundaries = [start_frame] + [r + overlap for r in read_starts] + [end_frame]
+    segments = [(start_frame, start_frame, boundaries[1])]
+    for r, b0, b1 in zip(read_starts, boundaries[1:-1], boundaries[2:]):
+        segments.append((r, b0, b1))
+    return segments
+
+
+# --- MERGING ---
+def _iou(a, b):
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+def stitch_ids(segments, min_iou=0.5):
+    """Maps every segment's local ByteTrack IDs to IDs that are consistent across the video.
+
+    In the overlap both neighbouring segments tracked the same frames; a local ID is
+    matched to the previous segment's ID it overlaps (IoU >= min_iou) most often.
+    IDs without a match get fresh numbers.
+    """
+    mappings = []
+    next_id = 1
+    for k, seg in enumerate(segments):
+        local_ids = set(seg['ids']) | {pid for obs in seg['tail'].values() for pid, _ in obs}
+        mapping = {}
+        if k == 0:
+            mapping = {pid: pid for pid in local_ids}
+        else:
+            prev, prev_map = segments[k - 1], mappings[k - 1]
+            votes = Counter()
+            for frame_idx, obs in seg['warmup'].items():
+                for pid, box in obs:
+                    best_iou, best_prev = min_iou, None
+                    for prev_pid, prev_box in prev['tail'].get(frame_idx, []):
+                        iou = _iou(box, prev_box)
+                        if iou >= best_iou:
+                            best_iou, best_prev = iou, prev_pid
+                    if best_prev is not None and best_prev in prev_map:
+                        votes[(pid, prev_map[best_prev])] += 1
+            taken = set()
+            for (pid, global_id), _ in votes.most_common():
+                if pid not in mapping and global_id not in taken:
+                    mapping[pid] = global_id
+                    taken.add(global_id)
+
+        for pid in sorted(local_ids):
+            if pid not in mapping:
+                mapping[pid] = next_id
+                next_id += 1
+        next_id = max([next_id] + [gid + 1 for gid in mapping.values()])
+        mappings.append(mapping)
+    return mappings
+
+
+def concat_videos(paths, output_path, fps, size, fourcc):
+    """Joins segment files in order; stream copy with ffmpeg when available, else re-encode"""
+    if shutil.which("ffmpeg"):
+        list_path = output_path + ".txt"
+        with open(list_path, "w") as f:
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path],
+                           check=True, timeout=3600)
+            return
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"[WARNING] ffmpeg concat failed ({e}), re-encoding segments")
+        finally:
+            os.remove(list_path)
+
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    out.release()
+
+
+def analyze_parallel(job, input_path, output_path, fourcc, start_frame, end_frame, fps, size,
+                     requirements, thumbnail_path, monitor_kwargs, settings, workers, overlap_seconds=2.0,
+                     episode_lost_after=2.0):
+    """Processes a recorded video in `workers` segments on a process pool and merges the output.
+
+    Returns (frames_written, episodes): per-frame results with person IDs stitched
+    across segment boundaries, folded into episodes timed in video seconds.
+    """
+    overlap = max(int(overlap_seconds * fps), 1)
+    segments = plan_segments(start_frame, end_frame, workers, overlap, keyframe_indices(input_path, fps))
+    print(f"[INFO] Job {job.id}: {len(segments)} segments over frames {start_frame}-{end_frame}")
+
+    ext = os.path.splitext(output_path)[1]
+    work_dir = tempfile.mkdtemp(prefix=f"job_{job.id}_")
+    tasks = [{
+        'index': i, 'input_path': input_path, 'read_start': r, 'write_start': w0, 'write_end': w1,
+        'overlap': overlap, 'output_path': os.path.join(work_dir, f"segment_{i:03d}{ext}"),
+        'fourcc': fourcc, 'fps': fps, 'size': size, 'requirements': requirements,
+        'thumbnail_path': thumbnail_path if i == 0 else None,
+    } for i, (r, w0, w1) in enumerate(segments)]
+
+    # spawn: CUDA and the ultralytics predictors don't survive fork
+    ctx = multiprocessing.get_context("spawn")
+    progress = ctx.Array('i', len(tasks), lock=False)
+    cancel = ctx.Value('b', 0, lock=False)
+    threads = max((os.cpu_count() or 1) // len(tasks), 1)
+
+    try:
+        with ProcessPoolExecutor(max_workers=len(tasks), mp_context=ctx, initializer=_init_worker,
+                                 initargs=(monitor_kwargs, settings, progress, cancel, threads)) as pool:
+            futures = [pool.submit(_process_segment, task) for task in tasks]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                job.update_progress(sum(progress))
+                if job.cancelled:
+                    cancel.value = 1
+                for fut in done:
+                    fut.result()  # re-raise worker errors
+            parts = sorted((fut.result() for fut in futures), key=lambda part: part['index'])
+
+        job.check_cancelled()
+
+        # Stitch IDs across boundaries, then fold the frames (in order) into episodes
+        mappings = stitch_ids(parts)
+        aggregator = EpisodeAggregator(lost_after=episode_lost_after)
+        frame_seconds = 1.0 / fps if fps > 0 else 1.0 / 30
+        results = []
+        for part, mapping in zip(parts, mappings):
+            for entry in part['results']:
+                entry['id'] = mapping.get(entry['id'], entry['id'])
+            for frame_idx, entries in groupby(part['results'], key=lambda entry: entry['frame']):
+                _, closed = aggregator.update(job.id, list(entries), frame_idx * frame_seconds)
+                results.extend(closed)
+        for closed in aggregator.flush().values():
+            results.extend(closed)
+
+        started = time.perf_counter()
+        concat_videos([part['path'] for part in parts], output_path, fps, size, fourcc)
+        print(f"[INFO] Job {job.id}: merged {len(parts)} segments in {time.perf_counter() - started:.1f}s")
+        return sum(part['frames'] for part in parts), results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
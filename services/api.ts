@@ -272,6 +272,17 @@ export interface VideoAnalysisResult {
   logs: DetectionLog[]
 }
 
+export interface VideoJobProgress {
+  job_id: string
+  status: "queued" | "running" | "done" | "failed" | "cancelled"
+  frames_done: number
+  total_frames: number
+  percent: number | null
+  fps: number
+  eta_seconds: number | null
+  error: string | null
+}
+
 // ============================================================================
 // SAFETY MONITOR API - Core Backend Integration
 // ============================================================================
@@ -313,9 +324,17 @@ export const safetyMonitorAPI = {
   getStats: (): Promise<StatsResponse> =>
     apiRequest<StatsResponse>("/api/stats"),
 
+  // Stage latency percentiles, FPS, drops and queue depths per camera / job
+  getMetrics: () => apiRequest("/api/metrics"),
+
   // --- Live Video Feed URL ---
   // --- Live Video Feed URL ---
   getVideoFeedUrl: (camId: string): string => `${API_BASE_URL}/video_feed/${camId}`,
+  // Server-sent events with per-frame boxes/labels/person results (draw overlays client-side)
+  getDetectionsStreamUrl: (camId: string): string => `${API_BASE_URL}/api/cameras/${camId}/detections`,
+  // WebSocket video: binary [seq uint32 BE][capture time float64 BE][JPEG]; reply {"ack": seq} per frame
+  getVideoSocketUrl: (camId: string, targetKbps = 1500): string =>
+    `${API_BASE_URL.replace(/^http/, "ws")}/ws/video/${camId}?target_kbps=${targetKbps}`,
 
   // --- Multi-Camera API ---
   getCameras: (): Promise<CameraConfig[]> => apiRequest<CameraConfig[]>("/api/cameras"),
@@ -323,9 +342,21 @@ export const safetyMonitorAPI = {
     apiRequest<{ status: string, camera: CameraConfig }>("/api/cameras", { method: "POST", body: JSON.stringify(config) }),
   deleteCamera: (id: string): Promise<{ status: string }> =>
     apiRequest<{ status: string }>(`/api/cameras/${id}`, { method: "DELETE" }),
+  // ROIs / inference size; pass an empty list and no size to go back to the full frame
+  setCameraRegion: (id: string, rois: CameraConfig["rois"] = [], inferenceSize?: number): Promise<{ status: string }> =>
+    apiRequest<{ status: string }>(`/api/cameras/${id}/region`, {
+      method: "POST",
+      body: JSON.stringify({ rois, inference_size: inferenceSize ?? null }),
+    }),
 
   // --- Video Upload & Analysis ---
-  analyzeVideo: async (file: File, startTime: number = 0, endTime?: number, requiredGear?: string[]): Promise<VideoAnalysisResult> => {
+  analyzeVideo: async (
+    file: File,
+    startTime: number = 0,
+    endTime?: number,
+    requiredGear?: string[],
+    onProgress?: (job: VideoJobProgress) => void,
+  ): Promise<VideoAnalysisResult> => {
     const formData = new FormData()
     formData.append("file", file)
     formData.append("start_time", startTime.toString())
@@ -346,7 +377,19 @@ export const safetyMonitorAPI = {
         throw new Error(`Upload failed: ${response.status}`)
       }
 
-      return response.json()
+      // The backend queues the upload as a job; poll until it finishes
+      const { job_id } = await response.json()
+      while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        const job: VideoJobProgress = await (await fetch(`${API_BASE_URL}/api/jobs/${job_id}`)).json()
+        onProgress?.(job)
+        if (job.status === "done") {
+          return (await fetch(`${API_BASE_URL}/api/jobs/${job_id}/result`)).json()
+        }
+        if (job.status !== "queued" && job.status !== "running") {
+          throw new Error(`Analysis ${job.status}${job.error ? `: ${job.error}` : ""}`)
+        }
+      }
     } catch (error) {
       console.error("Video analysis failed:", error)
       throw error
@@ -366,6 +409,9 @@ export interface CameraConfig {
   source: string
   type: 'webcam' | 'ip'
   zone?: string
+  // [x1, y1, x2, y2] rectangles or [[x, y], ...] polygons, in pixels or frame fractions
+  rois?: (number[] | number[][])[]
+  inference_size?: number | null
 }
 
 export interface VideoHistoryItem {
@@ -375,6 +421,9 @@ export interface VideoHistoryItem {
   timestamp: number
   violations: number
   total_detections: number
+  original_filename?: string
+  duration?: number
+  frame_count?: number
 }
 
 // ============================================================================
@@ -428,7 +477,23 @@ export const logsAPI = {
     return apiRequest(`/api/logs/search?${params.toString()}`)
   },
   getLog: (id: string) => apiRequest(`/api/logs/${id}`),
-  exportLogs: (format = "csv") => apiRequest(`/api/logs/export?format=${format}`),
+  // Streams the full export (CSV or NDJSON); returns it as a Blob for download
+  exportLogs: async (
+    format: "csv" | "ndjson" = "csv",
+    filters?: { start?: string; end?: string; source?: string; equipment?: string; violations_only?: boolean },
+  ): Promise<Blob> => {
+    const params = new URLSearchParams({ format })
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, String(value))
+      })
+    }
+    const response = await fetch(`${API_BASE_URL}/api/logs/export?${params.toString()}`)
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`)
+    }
+    return response.blob()
+  },
   // Backend logs (simplified structure from safety monitor)
   getBackendLogs: () => safetyMonitorAPI.getLogs(),
 }